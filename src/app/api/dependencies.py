@@ -1,42 +1,88 @@
+import secrets
+from dataclasses import dataclass
 from typing import Annotated, Any, cast
 
 from fastapi import Depends, HTTPException, Request
+from jose import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..core.config import settings
 from ..core.db.database import async_get_db
-from ..core.exceptions.http_exceptions import ForbiddenException, RateLimitException, UnauthorizedException
-from ..core.security import TokenType, oauth2_scheme, verify_token
-from ..core.utils.rate_limit import rate_limiter
-from ..crud.crud_rate_limit import crud_rate_limits
-from ..crud.crud_tier import crud_tiers
+from ..core.exceptions.http_exceptions import (
+    ForbiddenException,
+    NotFoundException,
+    RateLimitException,
+    UnauthorizedException,
+)
+from ..core.logger import logging
+from ..core.security import TokenType, oauth2_scheme, token_cache, verify_token
+from ..core.utils.rate_limit import rate_limit_policies, rate_limiter
 from ..crud.crud_users import crud_users
-from ..schemas.rate_limit import RateLimitRead, sanitize_path
-from ..schemas.tier import TierRead
-
-
+from ..schemas.rate_limit import sanitize_path
 
+logger = logging.getLogger(__name__)
 
 DEFAULT_LIMIT = settings.DEFAULT_RATE_LIMIT_LIMIT
 DEFAULT_PERIOD = settings.DEFAULT_RATE_LIMIT_PERIOD
 
 
-async def get_current_user(
-    token: Annotated[str, Depends(oauth2_scheme)], db: Annotated[AsyncSession, Depends(async_get_db)]
-) -> dict[str, Any] | None:
+@dataclass(frozen=True)
+class AuthContext:
+    """Outcome of verifying the access token of a request, kept in `request.state.auth`.
+
+    `user` is None if the token is invalid, revoked, or belongs to no active user.
+    """
+
+    token: str
+    user: dict[str, Any] | None
+
+
+async def _resolve_user(token: str, db: AsyncSession) -> dict[str, Any] | None:
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     token_data = await verify_token(token, TokenType.ACCESS, db)
     if token_data is None:
-        raise UnauthorizedException("User not authenticated.")
+        return None
 
     if "@" in token_data.username_or_email:
         user = await crud_users.get(db=db, email=token_data.username_or_email, is_deleted=False)
     else:
         user = await crud_users.get(db=db, username=token_data.username_or_email, is_deleted=False)
 
-    if user:
-        return cast(dict[str, Any], user)
+    if not user:
+        return None
+
+    user = cast(dict[str, Any], user)
+    token_cache.set(token, user, exp=jwt.get_unverified_claims(token)["exp"])
+    return user
 
-    raise UnauthorizedException("User not authenticated.")
+
+async def authenticate_request(request: Request, token: str, db: AsyncSession) -> dict[str, Any] | None:
+    """Verify the access token of a request once, and share the outcome with every dependency of that request.
+
+    `get_optional_user`, `get_current_user` and through them `get_current_superuser` and `rate_limiter_dependency`
+    all resolve the user through this, so a request is verified once however many of them it depends on.
+    """
+    auth: AuthContext | None = getattr(request.state, "auth", None)
+    if auth is None or auth.token != token:
+        auth = AuthContext(token=token, user=await _resolve_user(token, db))
+        request.state.auth = auth
+
+    return auth.user
+
+
+async def get_current_user(
+    request: Request,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[AsyncSession, Depends(async_get_db)],
+) -> dict[str, Any] | None:
+    user = await authenticate_request(request, token, db)
+    if user is None:
+        raise UnauthorizedException("User not authenticated.")
+
+    return user
 
 
 async def get_optional_user(request: Request, db: AsyncSession = Depends(async_get_db)) -> dict | None:
@@ -49,11 +95,7 @@ async def get_optional_user(request: Request, db: AsyncSession = Depends(async_g
         if token_type.lower() != "bearer" or not token_value:
             return None
 
-        token_data = await verify_token(token_value, TokenType.ACCESS, db)
-        if token_data is None:
-            return None
-
-        return await get_current_user(token_value, db=db)
+        return await authenticate_request(request, token_value, db)
 
     except HTTPException as http_exc:
         if http_exc.status_code != 401:
@@ -72,35 +114,57 @@ async def get_current_superuser(current_user: Annotated[dict, Depends(get_curren
     return current_user
 
 
+async def verify_metrics_token(request: Request) -> None:
+    """Authenticate a metrics scraper with the static `CACHE_METRICS_TOKEN` bearer token.
+
+    Scrapers such as Prometheus can not log in to obtain and refresh user tokens. The metrics endpoints are not
+    found while no token is configured.
+    """
+    expected = settings.CACHE_METRICS_TOKEN
+    if expected is None:
+        raise NotFoundException("Metrics are disabled, set CACHE_METRICS_TOKEN to enable them.")
+
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), expected.get_secret_value().encode()):
+        raise UnauthorizedException("Invalid metrics token.")
+
+
+def get_route_path(request: Request) -> str:
+    """Return the template of the route that matched the request, e.g. `/api/v1/building/{building_id}`.
+
+    Rate limit keys and policies use the template rather than the concrete URL, so that every building id shares
+    one counter and one policy. Falls back to the URL path if no route matched.
+    """
+    route = request.scope.get("route")
+    return getattr(route, "path_format", request.url.path)
+
+
 async def rate_limiter_dependency(
     request: Request, db: Annotated[AsyncSession, Depends(async_get_db)], user: dict | None = Depends(get_optional_user)
 ) -> None:
     if hasattr(request.app.state, "initialization_complete"):
         await request.app.state.initialization_complete.wait()
 
-    path = sanitize_path(request.url.path)
+    path = sanitize_path(get_route_path(request))
     if user:
         user_id = user["id"]
-        tier = await crud_tiers.get(db, id=user["tier_id"], schema_to_select=TierRead)
-        if tier:
-            tier = cast(TierRead, tier)
-            rate_limit = await crud_rate_limits.get(db=db, tier_id=tier.id, path=path, schema_to_select=RateLimitRead)
-            if rate_limit:
-                rate_limit = cast(RateLimitRead, rate_limit)
-                limit, period = rate_limit.limit, rate_limit.period
-            else:
-                logger.warning(
-                    f"User {user_id} with tier '{tier.name}' has no specific rate limit for path '{path}'. \
-                        Applying default rate limit."
-                )
-                limit, period = DEFAULT_LIMIT, DEFAULT_PERIOD
-        else:
+        tier_name, policy = await rate_limit_policies.get(db, tier_id=user["tier_id"], path=path)
+        if tier_name is None:
             logger.warning(f"User {user_id} has no assigned tier. Applying default rate limit.")
             limit, period = DEFAULT_LIMIT, DEFAULT_PERIOD
+        elif policy is None:
+            logger.warning(
+                f"User {user_id} with tier '{tier_name}' has no specific rate limit for path '{path}'. \
+                    Applying default rate limit."
+            )
+            limit, period = DEFAULT_LIMIT, DEFAULT_PERIOD
+        else:
+            limit, period = policy
     else:
         user_id = request.client.host if request.client else "unknown"
         limit, period = DEFAULT_LIMIT, DEFAULT_PERIOD
 
-    is_limited = await rate_limiter.is_rate_limited(db=db, user_id=user_id, path=path, limit=limit, period=period)
-    if is_limited:
+    result = await rate_limiter.check(user_id=user_id, path=path, limit=limit, period=period)
+    request.state.rate_limit = result
+    if result.limited:
         raise RateLimitException("Rate limit exceeded.")
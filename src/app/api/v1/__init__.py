@@ -16,6 +16,8 @@ from .building_type import router as building_type_router
 from .building_side import router as building_side_router
 from .defect_type import router as defect_type_router
 from .defect import router as defect_router
+from .cache import router as cache_router
+from .jwks import router as jwks_router
 
 router = APIRouter(prefix="/v1")
 router.include_router(login_router)
@@ -34,3 +36,5 @@ router.include_router(building_type_router)
 router.include_router(building_side_router)
 router.include_router(defect_type_router)
 router.include_router(defect_router)
+router.include_router(cache_router)
+router.include_router(jwks_router)
@@ -0,0 +1,19 @@
+from typing import Any
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse
+
+from ...api.dependencies import get_current_superuser, verify_metrics_token
+from ...core.utils.cache import get_cache_stats, render_cache_metrics
+
+router = APIRouter(tags=["cache"])
+
+
+@router.get("/cache/stats", dependencies=[Depends(get_current_superuser)])
+async def read_cache_stats(request: Request) -> dict[str, dict[str, Any]]:
+    return get_cache_stats()
+
+
+@router.get("/cache/metrics", dependencies=[Depends(verify_metrics_token)], response_class=PlainTextResponse)
+async def read_cache_metrics(request: Request) -> str:
+    return render_cache_metrics()
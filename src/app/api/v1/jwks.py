@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Response
+
+from ...core.config import settings
+from ...core.exceptions.http_exceptions import NotFoundException
+from ...core.security import key_ring
+
+router = APIRouter(tags=["login"])
+
+
+@router.get("/.well-known/jwks.json")
+async def read_jwks(response: Response) -> dict[str, list[dict[str, str]]]:
+    if key_ring is None:
+        raise NotFoundException("Tokens are signed with a shared secret, there are no public keys.")
+
+    response.headers["Cache-Control"] = f"public, max-age={settings.JWT_KEYS_MAX_AGE}"
+    return key_ring.jwks()
@@ -5,6 +5,7 @@ from fastapi import APIRouter, Depends, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...api.dependencies import get_current_superuser
 from ...core.config import settings
 from ...core.db.database import async_get_db
 from ...core.exceptions.http_exceptions import UnauthorizedException
@@ -15,6 +16,7 @@ from ...core.security import (
     authenticate_user,
     create_access_token,
     create_refresh_token,
+    get_password_hashing_stats,
     verify_token,
 )
 
@@ -78,3 +80,8 @@ async def refresh_access_token(request: Request, db: AsyncSession = Depends(asyn
 
     new_access_token = await create_access_token(data={"sub": user_data.username_or_email})
     return {"access_token": new_access_token, "token_type": "bearer"}
+
+
+@router.get("/login/stats", dependencies=[Depends(get_current_superuser)])
+async def read_password_hashing_stats(request: Request) -> dict[str, int]:
+    return get_password_hashing_stats()
@@ -9,7 +9,7 @@ from ...core.db.database import async_get_db
 from ...core.exceptions.http_exceptions import ForbiddenException, NotFoundException
 from ...core.utils.cache import cache
 from ...crud.crud_posts import crud_posts
-from ...crud.crud_users import crud_users
+from ...crud.crud_users import crud_users, user_lookup_cache
 from ...schemas.post import PostCreate, PostCreateInternal, PostRead, PostUpdate
 from ...schemas.user import UserRead
 
@@ -24,11 +24,10 @@ async def write_post(
     current_user: Annotated[dict, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(async_get_db)],
 ) -> PostRead:
-    db_user = await crud_users.get(db=db, username=username, is_deleted=False, schema_to_select=UserRead)
+    db_user = await user_lookup_cache.get(db=db, username=username)
     if db_user is None:
         raise NotFoundException("User not found")
 
-    db_user = cast(UserRead, db_user)
     if current_user["id"] != db_user["id"]:
         raise ForbiddenException()
 
@@ -77,6 +76,9 @@ async def write_post(
     key_prefix="{username}_posts:page_{page}:items_per_page:{items_per_page}",
     resource_id_name="username",
     expiration=60,
+    tags=["{username}_posts"],
+    lock_timeout=5,
+    stale_ttl=60,
 )
 async def read_posts(
     request: Request,
@@ -85,11 +87,10 @@ async def read_posts(
     page: int = 1,
     items_per_page: int = 10,
 ) -> dict:
-    db_user = await crud_users.get(db=db, username=username, is_deleted=False, schema_to_select=UserRead)
+    db_user = await user_lookup_cache.get(db=db, username=username)
     if not db_user:
         raise NotFoundException("User not found")
 
-    db_user = cast(UserRead, db_user)
     posts_data = await crud_posts.get_multi(
         db=db,
         offset=compute_offset(page, items_per_page),
@@ -103,15 +104,14 @@ async def read_posts(
 
 
 @router.get("/{username}/post/{id}", response_model=PostRead)
-@cache(key_prefix="{username}_post_cache", resource_id_name="id")
+@cache(key_prefix="{username}_post_cache", resource_id_name="id", local_expiration=10)
 async def read_post(
     request: Request, username: str, id: int, db: Annotated[AsyncSession, Depends(async_get_db)]
 ) -> PostRead:
-    db_user = await crud_users.get(db=db, username=username, is_deleted=False, schema_to_select=UserRead)
+    db_user = await user_lookup_cache.get(db=db, username=username)
     if db_user is None:
         raise NotFoundException("User not found")
 
-    db_user = cast(UserRead, db_user)
     db_post = await crud_posts.get(
         db=db, id=id, created_by_user_id=db_user["id"], is_deleted=False, schema_to_select=PostRead
     )
@@ -122,7 +122,7 @@ async def read_post(
 
 
 @router.patch("/{username}/post/{id}")
-@cache("{username}_post_cache", resource_id_name="id", pattern_to_invalidate_extra=["{username}_posts:*"])
+@cache("{username}_post_cache", resource_id_name="id", tags=["{username}_posts"])
 async def patch_post(
     request: Request,
     username: str,
@@ -131,11 +131,10 @@ async def patch_post(
     current_user: Annotated[dict, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(async_get_db)],
 ) -> dict[str, str]:
-    db_user = await crud_users.get(db=db, username=username, is_deleted=False, schema_to_select=UserRead)
+    db_user = await user_lookup_cache.get(db=db, username=username)
     if db_user is None:
         raise NotFoundException("User not found")
 
-    db_user = cast(UserRead, db_user)
     if current_user["id"] != db_user["id"]:
         raise ForbiddenException()
 
@@ -148,7 +147,7 @@ async def patch_post(
 
 
 @router.delete("/{username}/post/{id}")
-@cache("{username}_post_cache", resource_id_name="id", to_invalidate_extra={"{username}_posts": "{username}"})
+@cache("{username}_post_cache", resource_id_name="id", tags=["{username}_posts"])
 async def erase_post(
     request: Request,
     username: str,
@@ -156,11 +155,10 @@ async def erase_post(
     current_user: Annotated[dict, Depends(get_current_user)],
     db: Annotated[AsyncSession, Depends(async_get_db)],
 ) -> dict[str, str]:
-    db_user = await crud_users.get(db=db, username=username, is_deleted=False, schema_to_select=UserRead)
+    db_user = await user_lookup_cache.get(db=db, username=username)
     if db_user is None:
         raise NotFoundException("User not found")
 
-    db_user = cast(UserRead, db_user)
     if current_user["id"] != db_user["id"]:
         raise ForbiddenException()
 
@@ -174,11 +172,11 @@ async def erase_post(
 
 
 @router.delete("/{username}/db_post/{id}", dependencies=[Depends(get_current_superuser)])
-@cache("{username}_post_cache", resource_id_name="id", to_invalidate_extra={"{username}_posts": "{username}"})
+@cache("{username}_post_cache", resource_id_name="id", tags=["{username}_posts"])
 async def erase_db_post(
     request: Request, username: str, id: int, db: Annotated[AsyncSession, Depends(async_get_db)]
 ) -> dict[str, str]:
-    db_user = await crud_users.get(db=db, username=username, is_deleted=False, schema_to_select=UserRead)
+    db_user = await user_lookup_cache.get(db=db, username=username)
     if db_user is None:
         raise NotFoundException("User not found")
 
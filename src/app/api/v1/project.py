@@ -7,6 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ...api.dependencies import get_current_superuser,get_current_user
 from ...core.db.database import async_get_db
 from ...core.exceptions.http_exceptions import DuplicateValueException, NotFoundException
+from ...core.utils.cache import cache
 from ...crud.crud_project import crud_project
 from ...crud.crud_users import crud_users
 from ...schemas.project import ProjectCreate, ProjectCreateInternal, ProjectRead, ProjectUpdate
@@ -16,6 +17,7 @@ router = APIRouter(tags=["projects"])
 
 
 @router.post("/project2", response_model=ProjectRead, status_code=201)
+@cache("project_cache", resource_id_name="post.name")
 async def write_post(
     request: Request,
     post: ProjectCreate,
@@ -42,6 +44,7 @@ async def write_post(
     return cast(ProjectRead, project_read)
 
 @router.post("/project", status_code=201)
+@cache("project_cache", resource_id_name="project.name")
 async def write_project(    
     request: Request, project: ProjectCreate, db: Annotated[AsyncSession, Depends(async_get_db)]
 ) -> ProjectRead:
@@ -76,6 +79,7 @@ async def read_projects(
 
 
 @router.get("/project/{name}", response_model=ProjectRead)
+@cache("project_cache", resource_id_name="name", not_found_expiration=30)
 async def read_project(request: Request, name: str, db: Annotated[AsyncSession, Depends(async_get_db)]) -> ProjectRead:
     db_project = await crud_project.get(db=db, name=name, schema_to_select=ProjectRead)
     if db_project is None:
@@ -85,6 +89,7 @@ async def read_project(request: Request, name: str, db: Annotated[AsyncSession,
 
 
 @router.patch("/project/{name}", dependencies=[Depends(get_current_superuser)])
+@cache("project_cache", resource_id_name="name", to_invalidate_extra={"project_cache": "{values.name}"})
 async def patch_project(
     request: Request, name: str, values: ProjectUpdate, db: Annotated[AsyncSession, Depends(async_get_db)]
 ) -> dict[str, str]:
@@ -97,6 +102,7 @@ async def patch_project(
 
 
 @router.delete("/project/{name}", dependencies=[Depends(get_current_superuser)])
+@cache("project_cache", resource_id_name="name")
 async def erase_project(request: Request, name: str, db: Annotated[AsyncSession, Depends(async_get_db)]) -> dict[str, str]:
     db_project = await crud_project.get(db=db, name=name, schema_to_select=ProjectRead)
     if db_project is None:
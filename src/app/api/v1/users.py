@@ -7,10 +7,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ...api.dependencies import get_current_superuser, get_current_user
 from ...core.db.database import async_get_db
 from ...core.exceptions.http_exceptions import DuplicateValueException, ForbiddenException, NotFoundException
-from ...core.security import blacklist_token, get_password_hash, oauth2_scheme
+from ...core.security import blacklist_token, hash_password, oauth2_scheme, token_cache
 from ...crud.crud_rate_limit import crud_rate_limits
 from ...crud.crud_tier import crud_tiers
-from ...crud.crud_users import crud_users
+from ...crud.crud_users import crud_users, user_lookup_cache
 from ...schemas.tier import TierRead
 from ...schemas.user import UserCreate, UserCreateInternal, UserRead, UserTierUpdate, UserUpdate
 
@@ -30,7 +30,7 @@ async def write_user(
         raise DuplicateValueException("Username not available")
 
     user_internal_dict = user.model_dump()
-    user_internal_dict["hashed_password"] = get_password_hash(password=user_internal_dict["password"])
+    user_internal_dict["hashed_password"] = await hash_password(password=user_internal_dict["password"])
     del user_internal_dict["password"]
 
     user_internal = UserCreateInternal(**user_internal_dict)
@@ -99,6 +99,8 @@ async def patch_user(
             raise DuplicateValueException("Email is already registered")
 
     await crud_users.update(db=db, object=values, username=username)
+    token_cache.invalidate_user(username)
+    user_lookup_cache.invalidate(username)
     return {"message": "User updated"}
 
 
@@ -118,6 +120,8 @@ async def erase_user(
         raise ForbiddenException()
 
     await crud_users.delete(db=db, username=username)
+    token_cache.invalidate_user(username)
+    user_lookup_cache.invalidate(username)
     await blacklist_token(token=token, db=db)
     return {"message": "User deleted"}
 
@@ -134,6 +138,8 @@ async def erase_db_user(
         raise NotFoundException("User not found")
 
     await crud_users.db_delete(db=db, username=username)
+    token_cache.invalidate_user(username)
+    user_lookup_cache.invalidate(username)
     await blacklist_token(token=token, db=db)
     return {"message": "User deleted from the database"}
 
@@ -142,22 +148,19 @@ async def erase_db_user(
 async def read_user_rate_limits(
     request: Request, username: str, db: Annotated[AsyncSession, Depends(async_get_db)]
 ) -> dict[str, Any]:
-    db_user = await crud_users.get(db=db, username=username, schema_to_select=UserRead)
-    if db_user is None:
+    user_dict = await user_lookup_cache.get(db=db, username=username, include_deleted=True)
+    if user_dict is None:
         raise NotFoundException("User not found")
 
-    db_user = cast(UserRead, db_user)
-    user_dict = db_user.model_dump()
-    if db_user.tier_id is None:
+    if user_dict["tier_id"] is None:
         user_dict["tier_rate_limits"] = []
         return user_dict
 
-    db_tier = await crud_tiers.get(db=db, id=db_user.tier_id, schema_to_select=TierRead)
+    db_tier = await crud_tiers.get(db=db, id=user_dict["tier_id"], schema_to_select=TierRead)
     if db_tier is None:
         raise NotFoundException("Tier not found")
 
-    db_tier = cast(TierRead, db_tier)
-    db_rate_limits = await crud_rate_limits.get_multi(db=db, tier_id=db_tier.id)
+    db_rate_limits = await crud_rate_limits.get_multi(db=db, tier_id=user_dict["tier_id"])
 
     user_dict["tier_rate_limits"] = db_rate_limits["data"]
 
@@ -168,22 +171,18 @@ async def read_user_rate_limits(
 async def read_user_tier(
     request: Request, username: str, db: Annotated[AsyncSession, Depends(async_get_db)]
 ) -> dict | None:
-    db_user = await crud_users.get(db=db, username=username, schema_to_select=UserRead)
-    if db_user is None:
+    user_dict = await user_lookup_cache.get(db=db, username=username, include_deleted=True)
+    if user_dict is None:
         raise NotFoundException("User not found")
 
-    db_user = cast(UserRead, db_user)
-    if db_user.tier_id is None:
+    if user_dict["tier_id"] is None:
         return None
 
-    db_tier = await crud_tiers.get(db=db, id=db_user.tier_id, schema_to_select=TierRead)
+    db_tier = await crud_tiers.get(db=db, id=user_dict["tier_id"], schema_to_select=TierRead)
     if not db_tier:
         raise NotFoundException("Tier not found")
 
-    db_tier = cast(TierRead, db_tier)
-
-    user_dict = db_user.model_dump()
-    tier_dict = db_tier.model_dump()
+    tier_dict = cast(dict[str, Any], db_tier)
 
     for key, value in tier_dict.items():
         user_dict[f"tier_{key}"] = value
@@ -205,4 +204,6 @@ async def patch_user_tier(
         raise NotFoundException("Tier not found")
 
     await crud_users.update(db=db, object=values.model_dump(), username=username)
+    token_cache.invalidate_user(username)
+    user_lookup_cache.invalidate(username)
     return {"message": f"User {db_user.name} Tier updated"}
@@ -22,8 +22,23 @@ class AppSettings(BaseSettings):
 class CryptSettings(BaseSettings):
     SECRET_KEY: SecretStr = config("SECRET_KEY", cast=SecretStr)
     ALGORITHM: str = config("ALGORITHM", default="HS256")
+    JWT_KEYS_DIR: str | None = config("JWT_KEYS_DIR", default=None)
+    JWT_SIGNING_KEY_ID: str | None = config("JWT_SIGNING_KEY_ID", default=None)
+    JWT_KEYS_MAX_AGE: int = config("JWT_KEYS_MAX_AGE", default=60)
     ACCESS_TOKEN_EXPIRE_MINUTES: int = config("ACCESS_TOKEN_EXPIRE_MINUTES", default=30)
     REFRESH_TOKEN_EXPIRE_DAYS: int = config("REFRESH_TOKEN_EXPIRE_DAYS", default=7)
+    PASSWORD_HASH_ROUNDS: int = config("PASSWORD_HASH_ROUNDS", default=12)
+    PASSWORD_HASH_MAX_WORKERS: int = config("PASSWORD_HASH_MAX_WORKERS", default=4)
+    AUTH_CACHE_TTL_SECONDS: int = config("AUTH_CACHE_TTL_SECONDS", default=30)
+    AUTH_CACHE_MAX_ENTRIES: int = config("AUTH_CACHE_MAX_ENTRIES", default=10_000)
+    USER_CACHE_TTL_SECONDS: int = config("USER_CACHE_TTL_SECONDS", default=30)
+    USER_CACHE_MAX_ENTRIES: int = config("USER_CACHE_MAX_ENTRIES", default=10_000)
+    TOKEN_BLACKLIST_BLOOM_CAPACITY: int = config("TOKEN_BLACKLIST_BLOOM_CAPACITY", default=100_000)
+    TOKEN_BLACKLIST_BLOOM_ERROR_RATE: float = config("TOKEN_BLACKLIST_BLOOM_ERROR_RATE", default=0.01)
+    TOKEN_BLACKLIST_CHANNEL: str = config("TOKEN_BLACKLIST_CHANNEL", default="token_blacklist:revoked")
+    TOKEN_BLACKLIST_REDIS_HOST: str = config("TOKEN_BLACKLIST_REDIS_HOST", default="localhost")
+    TOKEN_BLACKLIST_REDIS_PORT: int = config("TOKEN_BLACKLIST_REDIS_PORT", default=6379)
+    TOKEN_BLACKLIST_REDIS_URL: str = f"redis://{TOKEN_BLACKLIST_REDIS_HOST}:{TOKEN_BLACKLIST_REDIS_PORT}"
 
 
 class DatabaseSettings(BaseSettings):
@@ -91,6 +106,12 @@ class RedisCacheSettings(BaseSettings):
     REDIS_CACHE_HOST: str = config("REDIS_CACHE_HOST", default="localhost")
     REDIS_CACHE_PORT: int = config("REDIS_CACHE_PORT", default=6379)
     REDIS_CACHE_URL: str = f"redis://{REDIS_CACHE_HOST}:{REDIS_CACHE_PORT}"
+    CACHE_LOCAL_MAX_BYTES: int = config("CACHE_LOCAL_MAX_BYTES", default=32 * 1024 * 1024)
+    CACHE_INVALIDATION_CHANNEL: str = config("CACHE_INVALIDATION_CHANNEL", default="cache:invalidate")
+    CACHE_SERIALIZER: str = config("CACHE_SERIALIZER", default="json")
+    CACHE_COMPRESSION: str | None = config("CACHE_COMPRESSION", default=None)
+    CACHE_COMPRESSION_THRESHOLD: int = config("CACHE_COMPRESSION_THRESHOLD", default=4096)
+    CACHE_METRICS_TOKEN: SecretStr | None = config("CACHE_METRICS_TOKEN", default=None, cast=SecretStr)
 
 
 class ClientSideCacheSettings(BaseSettings):
@@ -100,17 +121,29 @@ class ClientSideCacheSettings(BaseSettings):
 class RedisQueueSettings(BaseSettings):
     REDIS_QUEUE_HOST: str = config("REDIS_QUEUE_HOST", default="localhost")
     REDIS_QUEUE_PORT: int = config("REDIS_QUEUE_PORT", default=6379)
+    TOKEN_BLACKLIST_PURGE_MINUTE: int = config("TOKEN_BLACKLIST_PURGE_MINUTE", default=0)
+    TOKEN_BLACKLIST_PURGE_BATCH_SIZE: int = config("TOKEN_BLACKLIST_PURGE_BATCH_SIZE", default=1000)
 
 
 class RedisRateLimiterSettings(BaseSettings):
     REDIS_RATE_LIMIT_HOST: str = config("REDIS_RATE_LIMIT_HOST", default="localhost")
     REDIS_RATE_LIMIT_PORT: int = config("REDIS_RATE_LIMIT_PORT", default=6379)
     REDIS_RATE_LIMIT_URL: str = f"redis://{REDIS_RATE_LIMIT_HOST}:{REDIS_RATE_LIMIT_PORT}"
+    RATE_LIMIT_ALGORITHM: str = config("RATE_LIMIT_ALGORITHM", default="sliding_window")
+    RATE_LIMIT_LEASE_FRACTION: float = config("RATE_LIMIT_LEASE_FRACTION", default=0.0)
 
 
 class DefaultRateLimitSettings(BaseSettings):
     DEFAULT_RATE_LIMIT_LIMIT: int = config("DEFAULT_RATE_LIMIT_LIMIT", default=10)
     DEFAULT_RATE_LIMIT_PERIOD: int = config("DEFAULT_RATE_LIMIT_PERIOD", default=3600)
+    RATE_LIMIT_POLICY_MAX_AGE: int = config("RATE_LIMIT_POLICY_MAX_AGE", default=60)
+
+
+class LoadSheddingSettings(BaseSettings):
+    LOAD_SHEDDING_INITIAL_LIMIT: int = config("LOAD_SHEDDING_INITIAL_LIMIT", default=15)
+    LOAD_SHEDDING_MIN_LIMIT: int = config("LOAD_SHEDDING_MIN_LIMIT", default=5)
+    LOAD_SHEDDING_MAX_LIMIT: int = config("LOAD_SHEDDING_MAX_LIMIT", default=100)
+    LOAD_SHEDDING_LATENCY_TARGET: float = config("LOAD_SHEDDING_LATENCY_TARGET", default=0.5)
 
 
 class EnvironmentOption(Enum):
@@ -134,6 +167,7 @@ class Settings(
     RedisQueueSettings,
     RedisRateLimiterSettings,
     DefaultRateLimitSettings,
+    LoadSheddingSettings,
     EnvironmentSettings,
 ):
     pass
@@ -14,3 +14,9 @@ class MissingClientError(Exception):
     def __init__(self, message: str = "Client is None.") -> None:
         self.message = message
         super().__init__(self.message)
+
+
+class CacheKeyTemplateError(Exception):
+    def __init__(self, message: str = "Cache key template does not match the function signature.") -> None:
+        self.message = message
+        super().__init__(self.message)
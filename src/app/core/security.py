@@ -1,17 +1,27 @@
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
 from datetime import UTC, datetime, timedelta
 from enum import Enum
+from pathlib import Path
 from typing import Any, Literal, cast
 
+import anyio
 import bcrypt
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+from jose.utils import base64url_decode, base64url_encode
 from pydantic import SecretStr
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..crud.crud_users import crud_users
 from .config import settings
 from .db.crud_token_blacklist import crud_token_blacklist
+from .logger import logging
 from .schemas import TokenBlacklistCreate, TokenData
+from .utils.token_blacklist import token_blacklist, token_id
 
 SECRET_KEY: SecretStr = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
@@ -20,6 +30,221 @@ REFRESH_TOKEN_EXPIRE_DAYS = settings.REFRESH_TOKEN_EXPIRE_DAYS
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/login")
 
+_EC_COORDINATE_SIZES = {"P-256": 32, "P-384": 48, "P-521": 66}
+
+logger = logging.getLogger(__name__)
+
+# bcrypt releases the GIL, so hashing runs in parallel on these threads while the event loop keeps serving requests.
+# The pool is separate from the default one so a burst of logins cannot starve other `run_sync` callers.
+password_hashing_limiter = anyio.CapacityLimiter(settings.PASSWORD_HASH_MAX_WORKERS)
+
+
+class TokenCache:
+    """In-process cache of verified access tokens and the users they resolve to.
+
+    Parameters
+    ----------
+    ttl: float
+        Seconds an entry is kept, never beyond the token's own expiry. 0 disables the cache.
+    max_entries: int, optional
+        Maximum number of cached tokens, the least recently used is dropped beyond that. Defaults to 10000.
+
+    Note
+    ----
+        - Entries are keyed by the SHA-256 of the token, so the tokens themselves are not kept in memory.
+        - User updates or deletions invalidate the entries of the worker handling them. Other workers may keep
+          serving a cached entry for up to `ttl` seconds. Logout invalidates the entries of every worker subscribed
+          to the token blacklist.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 10_000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+        self.keys_by_username: dict[str, set[str]] = {}
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> dict[str, Any] | None:
+        key = self._key(token)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        user, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            return None
+
+        self.entries.move_to_end(key)
+        return dict(user)
+
+    def set(self, token: str, user: dict[str, Any], exp: float) -> None:
+        expires_at = min(time.time() + self.ttl, exp)
+        if self.ttl <= 0 or expires_at <= time.time():
+            return
+
+        key = self._key(token)
+        self._remove(key)
+        self.entries[key] = (dict(user), expires_at)
+        self.keys_by_username.setdefault(user["username"], set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+
+        username = entry[0]["username"]
+        keys = self.keys_by_username.get(username, set())
+        keys.discard(key)
+        if not keys:
+            self.keys_by_username.pop(username, None)
+
+    def invalidate_token(self, token: str) -> None:
+        self._remove(self._key(token))
+
+    def invalidate_key(self, key: str) -> None:
+        self._remove(key)
+
+    def invalidate_user(self, username: str) -> None:
+        for key in self.keys_by_username.pop(username, set()):
+            self.entries.pop(key, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.keys_by_username.clear()
+
+
+token_cache = TokenCache(ttl=settings.AUTH_CACHE_TTL_SECONDS, max_entries=settings.AUTH_CACHE_MAX_ENTRIES)
+token_blacklist.on_revoke = token_cache.invalidate_key
+
+
+class KeyRing:
+    """Asymmetric JWT keys, loaded from the `{kid}.pem` private key files of a directory.
+
+    Parameters
+    ----------
+    directory: str
+        Directory holding one PEM private key per file, the file name without extension being its key id.
+    algorithm: str
+        Signing algorithm of every key, e.g. "RS256" or "ES256".
+    signing_key_id: str | None, optional
+        Key id new tokens are signed with. Defaults to the last key id in sorted order.
+    max_age: float, optional
+        Seconds between scans of `directory`. Defaults to 60.
+    rescan_interval: float, optional
+        Minimum seconds between the extra scans made for tokens signed with an unknown key id. Defaults to 1.
+
+    Note
+    ----
+        - Parsed keys are kept in process and only files added or modified since the last scan are parsed again,
+          so signing and verifying cost no file I/O.
+        - To rotate, add the new key file and make it the signing key, e.g. by naming it after the date. Keep
+          the previous file until the tokens it signed have expired, `REFRESH_TOKEN_EXPIRE_DAYS`, since tokens are
+          verified with the key named by their `kid` header. Removed keys stop verifying within `max_age`.
+        - A token signed with a key id this process does not know yet, e.g. by another worker right after a
+          rotation, triggers a scan right away, at most once per `rescan_interval`, so unknown key ids can not make
+          every request scan the directory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        algorithm: str,
+        signing_key_id: str | None = None,
+        max_age: float = 60,
+        rescan_interval: float = 1.0,
+    ) -> None:
+        self.directory = Path(directory)
+        self.algorithm = algorithm
+        self.signing_key_id = signing_key_id
+        self.max_age = max_age
+        self.rescan_interval = rescan_interval
+        self.keys: dict[str, tuple[float, Key, Key]] = {}
+        self.loaded_at = 0.0
+
+    def _refresh(self, force: bool = False) -> None:
+        if self.keys and time.monotonic() - self.loaded_at < (self.rescan_interval if force else self.max_age):
+            return
+
+        keys = {}
+        for path in sorted(self.directory.glob("*.pem")):
+            modified_at = path.stat().st_mtime
+            entry = self.keys.get(path.stem)
+            if entry is None or entry[0] != modified_at:
+                private_key = jwk.construct(path.read_text(), self.algorithm)
+                entry = (modified_at, private_key, private_key.public_key())
+            keys[path.stem] = entry
+
+        if not keys:
+            raise ValueError(f"No JWT signing keys found in {self.directory}.")
+
+        self.keys = keys
+        self.loaded_at = time.monotonic()
+
+    def signing_key(self) -> tuple[str, Key]:
+        self._refresh()
+        kid = self.signing_key_id or max(self.keys)
+        return kid, self.keys[kid][1]
+
+    def verification_key(self, kid: str | None) -> Key:
+        self._refresh()
+        if kid is not None and kid not in self.keys:
+            self._refresh(force=True)
+        if kid is None or kid not in self.keys:
+            raise JWTError("Unknown signing key.")
+
+        return self.keys[kid][2]
+
+    def jwks(self) -> dict[str, list[dict[str, str]]]:
+        """The public keys, as a JSON Web Key Set."""
+        self._refresh()
+        return {"keys": [_public_jwk(kid, public_key) for kid, (_, _, public_key) in self.keys.items()]}
+
+
+def _public_jwk(kid: str, public_key: Key) -> dict[str, str]:
+    data: dict[str, str] = {**public_key.to_dict(), "kid": kid, "use": "sig"}
+    if data["kty"] == "EC":
+        # EC coordinates have a fixed length (RFC 7518, 6.2.1.2), which python-jose does not pad or trim to.
+        size = _EC_COORDINATE_SIZES[data["crv"]]
+        for coordinate in ("x", "y"):
+            value = base64url_decode(data[coordinate].encode())[-size:].rjust(size, b"\0")
+            data[coordinate] = base64url_encode(value).decode()
+
+    return data
+
+
+key_ring: KeyRing | None = None
+if not ALGORITHM.startswith("HS"):
+    if settings.JWT_KEYS_DIR is None:
+        raise ValueError(f"JWT_KEYS_DIR must be set to sign tokens with {ALGORITHM}.")
+
+    key_ring = KeyRing(
+        settings.JWT_KEYS_DIR, ALGORITHM, signing_key_id=settings.JWT_SIGNING_KEY_ID, max_age=settings.JWT_KEYS_MAX_AGE
+    )
+
+
+def encode_token(claims: dict[str, Any]) -> str:
+    """Sign claims with `SECRET_KEY`, or with the current key of the key ring in asymmetric mode."""
+    if key_ring is None:
+        return cast(str, jwt.encode(claims, SECRET_KEY.get_secret_value(), algorithm=ALGORITHM))
+
+    kid, key = key_ring.signing_key()
+    return cast(str, jwt.encode(claims, key, algorithm=key_ring.algorithm, headers={"kid": kid}))
+
+
+def decode_token(token: str) -> dict[str, Any]:
+    """Verify the signature and expiry of a token and return its claims, raising `JWTError` if invalid."""
+    if key_ring is None:
+        return cast(dict[str, Any], jwt.decode(token, SECRET_KEY.get_secret_value(), algorithms=[ALGORITHM]))
+
+    key = key_ring.verification_key(jwt.get_unverified_header(token).get("kid"))
+    return cast(dict[str, Any], jwt.decode(token, key, algorithms=[key_ring.algorithm]))
+
 
 class TokenType(str, Enum):
     ACCESS = "access"
@@ -27,15 +252,40 @@ class TokenType(str, Enum):
 
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
-    correct_password: bool = bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    correct_password: bool = await anyio.to_thread.run_sync(
+        bcrypt.checkpw, plain_password.encode(), hashed_password.encode(), limiter=password_hashing_limiter
+    )
     return correct_password
 
 
 def get_password_hash(password: str) -> str:
-    hashed_password: str = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    hashed_password: str = bcrypt.hashpw(
+        password.encode(), bcrypt.gensalt(rounds=settings.PASSWORD_HASH_ROUNDS)
+    ).decode()
     return hashed_password
 
 
+async def hash_password(password: str) -> str:
+    """Hash a password on the password hashing pool, see `get_password_hash`."""
+    hashed_password: str = await anyio.to_thread.run_sync(get_password_hash, password, limiter=password_hashing_limiter)
+    return hashed_password
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a bcrypt hash was made with a cost other than `PASSWORD_HASH_ROUNDS`."""
+    return int(hashed_password.split("$")[2]) != settings.PASSWORD_HASH_ROUNDS
+
+
+def get_password_hashing_stats() -> dict[str, int]:
+    """Usage of the password hashing pool, `queued` being the number of hashes waiting for a thread."""
+    statistics = password_hashing_limiter.statistics()
+    return {
+        "max_workers": int(statistics.total_tokens),
+        "in_flight": statistics.borrowed_tokens,
+        "queued": statistics.tasks_waiting,
+    }
+
+
 async def authenticate_user(username_or_email: str, password: str, db: AsyncSession) -> dict[str, Any] | Literal[False]:
     if "@" in username_or_email:
         db_user = await crud_users.get(db=db, email=username_or_email, is_deleted=False)
@@ -49,6 +299,11 @@ async def authenticate_user(username_or_email: str, password: str, db: AsyncSess
     if not await verify_password(password, db_user["hashed_password"]):
         return False
 
+    if password_needs_rehash(db_user["hashed_password"]):
+        db_user["hashed_password"] = await hash_password(password)
+        await crud_users.update(db=db, object={"hashed_password": db_user["hashed_password"]}, id=db_user["id"])
+        logger.info(f"Rehashed password of user {db_user['id']} with cost {settings.PASSWORD_HASH_ROUNDS}")
+
     return db_user
 
 
@@ -58,8 +313,8 @@ async def create_access_token(data: dict[str, Any], expires_delta: timedelta | N
         expire = datetime.now(UTC).replace(tzinfo=None) + expires_delta
     else:
         expire = datetime.now(UTC).replace(tzinfo=None) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire, "token_type": TokenType.ACCESS})
-    encoded_jwt: str = jwt.encode(to_encode, SECRET_KEY.get_secret_value(), algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "token_type": TokenType.ACCESS, "jti": uuid.uuid4().hex})
+    encoded_jwt = encode_token(to_encode)
     return encoded_jwt
 
 
@@ -69,8 +324,8 @@ async def create_refresh_token(data: dict[str, Any], expires_delta: timedelta |
         expire = datetime.now(UTC).replace(tzinfo=None) + expires_delta
     else:
         expire = datetime.now(UTC).replace(tzinfo=None) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "token_type": TokenType.REFRESH})
-    encoded_jwt: str = jwt.encode(to_encode, SECRET_KEY.get_secret_value(), algorithm=ALGORITHM)
+    to_encode.update({"exp": expire, "token_type": TokenType.REFRESH, "jti": uuid.uuid4().hex})
+    encoded_jwt = encode_token(to_encode)
     return encoded_jwt
 
 
@@ -90,13 +345,17 @@ async def verify_token(token: str, expected_token_type: TokenType, db: AsyncSess
     -------
     TokenData | None
         TokenData instance if the token is valid, None otherwise.
-    """
-    is_blacklisted = await crud_token_blacklist.exists(db, token=token)
-    if is_blacklisted:
-        return None
 
+    Note
+    ----
+        The signature is checked before the blacklist, so forged tokens cost no lookup, and the blacklist is
+        pre-checked in process, so most valid tokens cost none either. See `TokenBlacklist`.
+    """
     try:
-        payload = jwt.decode(token, SECRET_KEY.get_secret_value(), algorithms=[ALGORITHM])
+        payload = decode_token(token)
+        if await token_blacklist.is_revoked(token_id(token, payload), token, db):
+            return None
+
         username_or_email: str | None = payload.get("sub")
         token_type: str | None = payload.get("token_type")
 
@@ -122,16 +381,23 @@ async def blacklist_tokens(access_token: str, refresh_token: str, db: AsyncSessi
         Database session for performing database operations.
     """
     for token in [access_token, refresh_token]:
-        payload = jwt.decode(token, SECRET_KEY.get_secret_value(), algorithms=[ALGORITHM])
-        exp_timestamp = payload.get("exp")
-        if exp_timestamp is not None:
-            expires_at = datetime.fromtimestamp(exp_timestamp)
-            await crud_token_blacklist.create(db, object=TokenBlacklistCreate(token=token, expires_at=expires_at))
+        await blacklist_token(token, db)
 
 
 async def blacklist_token(token: str, db: AsyncSession) -> None:
-    payload = jwt.decode(token, SECRET_KEY.get_secret_value(), algorithms=[ALGORITHM])
+    """Blacklist a token, durably in the database and in the Redis blacklist until it expires.
+
+    Parameters
+    ----------
+    token: str
+        The token to blacklist
+    db: AsyncSession
+        Database session for performing database operations.
+    """
+    payload = decode_token(token)
     exp_timestamp = payload.get("exp")
     if exp_timestamp is not None:
         expires_at = datetime.fromtimestamp(exp_timestamp)
         await crud_token_blacklist.create(db, object=TokenBlacklistCreate(token=token, expires_at=expires_at))
+        await token_blacklist.revoke(token, token_id(token, payload), exp=exp_timestamp)
+    token_cache.invalidate_token(token)
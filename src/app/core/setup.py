@@ -1,16 +1,22 @@
+import asyncio
 from collections.abc import AsyncGenerator, Callable
 from contextlib import _AsyncGeneratorContextManager, asynccontextmanager
 from typing import Any
 
 import anyio
 import fastapi
+import redis.asyncio as redis
 from fastapi import APIRouter, Depends, FastAPI
 from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 
 from ..api.dependencies import get_current_superuser
-from ..core.utils.rate_limit import rate_limiter  # Optional, remove if also using Redis
+from ..core.utils import cache
+from ..core.utils.rate_limit import rate_limit_policies, rate_limiter
+from ..core.utils.token_blacklist import token_blacklist
 from ..middleware.client_cache_middleware import ClientCacheMiddleware
+from ..middleware.load_shedding_middleware import LoadSheddingMiddleware
+from ..middleware.rate_limit_headers_middleware import RateLimitHeadersMiddleware
 from ..models import *  # noqa: F403
 from .config import (
     AppSettings,
@@ -18,9 +24,12 @@ from .config import (
     DatabaseSettings,
     EnvironmentOption,
     EnvironmentSettings,
+    LoadSheddingSettings,
+    RedisCacheSettings,
+    RedisRateLimiterSettings,
     settings,
 )
-from .db.database import Base
+from .db.database import Base, local_session
 from .db.database import async_engine as engine
 
 
@@ -30,6 +39,72 @@ async def create_tables() -> None:
         await conn.run_sync(Base.metadata.create_all)
 
 
+# -------------- cache --------------
+async def create_redis_cache_pool() -> None:
+    cache.pool = redis.ConnectionPool.from_url(settings.REDIS_CACHE_URL)
+    cache.client = redis.Redis.from_pool(cache.pool)  # type: ignore
+    cache.codec = cache.CacheCodec(
+        serializer=settings.CACHE_SERIALIZER,
+        compression=settings.CACHE_COMPRESSION,
+        compression_threshold=settings.CACHE_COMPRESSION_THRESHOLD,
+    )
+    if settings.CACHE_LOCAL_MAX_BYTES > 0:
+        cache.local_cache = cache.LocalCache(max_bytes=settings.CACHE_LOCAL_MAX_BYTES)
+        cache.invalidation_channel = settings.CACHE_INVALIDATION_CHANNEL
+
+
+async def start_token_blacklist() -> asyncio.Task:
+    # Not the cache instance: revocations must never be evicted, so this Redis has to run with `noeviction`.
+    token_blacklist.client = redis.Redis.from_url(settings.TOKEN_BLACKLIST_REDIS_URL)
+    token_blacklist.capacity = settings.TOKEN_BLACKLIST_BLOOM_CAPACITY
+    token_blacklist.error_rate = settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE
+    token_blacklist.channel = settings.TOKEN_BLACKLIST_CHANNEL
+    return asyncio.create_task(token_blacklist.listen())
+
+
+async def close_token_blacklist() -> None:
+    if token_blacklist.client is not None:
+        await token_blacklist.client.aclose()  # type: ignore
+    token_blacklist.client = None
+
+
+async def close_redis_cache_pool() -> None:
+    if cache.client is not None:
+        await cache.client.aclose()  # type: ignore
+    cache.local_cache = None
+
+
+# -------------- rate limit --------------
+async def create_redis_rate_limit_pool() -> None:
+    rate_limiter.initialize(
+        settings.REDIS_RATE_LIMIT_URL,
+        algorithm=settings.RATE_LIMIT_ALGORITHM,
+        lease_fraction=settings.RATE_LIMIT_LEASE_FRACTION,
+    )
+
+
+async def load_rate_limit_policies() -> None:
+    rate_limit_policies.max_age = settings.RATE_LIMIT_POLICY_MAX_AGE
+    async with local_session() as db:
+        await rate_limit_policies.load(db)
+
+
+async def close_redis_rate_limit_pool() -> None:
+    await rate_limiter.close()
+
+
+# -------------- background tasks --------------
+async def cancel_task(task: asyncio.Task | None) -> None:
+    if task is None:
+        return
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
 # -------------- thread pool control --------------
 async def set_threadpool_tokens(number_of_tokens: int = 100) -> None:
     limiter = anyio.to_thread.current_default_thread_limiter()
@@ -40,8 +115,11 @@ async def set_threadpool_tokens(number_of_tokens: int = 100) -> None:
 def lifespan_factory(
     settings: (
         DatabaseSettings
+        | RedisCacheSettings
         | AppSettings
+        | RedisRateLimiterSettings
         | ClientSideCacheSettings
+        | LoadSheddingSettings
         | EnvironmentSettings
     ),
     create_tables_on_start: bool = True,
@@ -54,19 +132,41 @@ def lifespan_factory(
 
         initialization_complete = Event()
         app.state.initialization_complete = initialization_complete
+        invalidation_listener: asyncio.Task | None = None
+        blacklist_listener: asyncio.Task | None = None
 
         await set_threadpool_tokens()
 
         try:
+            if isinstance(settings, RedisCacheSettings):
+                await create_redis_cache_pool()
+                if cache.local_cache is not None:
+                    invalidation_listener = asyncio.create_task(cache.listen_for_invalidations())
+
+            if isinstance(settings, RedisRateLimiterSettings):
+                await create_redis_rate_limit_pool()
+
             if create_tables_on_start:
                 await create_tables()
 
+            if isinstance(settings, RedisRateLimiterSettings):
+                await load_rate_limit_policies()
+
+            if isinstance(settings, RedisCacheSettings):
+                blacklist_listener = await start_token_blacklist()
+
             initialization_complete.set()
 
             yield
 
         finally:
-            pass  # No Redis shutdown needed
+            await cancel_task(invalidation_listener)
+            await cancel_task(blacklist_listener)
+            if isinstance(settings, RedisCacheSettings):
+                await close_token_blacklist()
+                await close_redis_cache_pool()
+            if isinstance(settings, RedisRateLimiterSettings):
+                await close_redis_rate_limit_pool()
 
     return lifespan
 
@@ -76,8 +176,11 @@ def create_application(
     router: APIRouter,
     settings: (
         DatabaseSettings
+        | RedisCacheSettings
         | AppSettings
+        | RedisRateLimiterSettings
         | ClientSideCacheSettings
+        | LoadSheddingSettings
         | EnvironmentSettings
     ),
     create_tables_on_start: bool = True,
@@ -104,6 +207,18 @@ def create_application(
     if isinstance(settings, ClientSideCacheSettings):
         application.add_middleware(ClientCacheMiddleware, max_age=settings.CLIENT_CACHE_MAX_AGE)
 
+    if isinstance(settings, RedisRateLimiterSettings):
+        application.add_middleware(RateLimitHeadersMiddleware)
+
+    if isinstance(settings, LoadSheddingSettings):
+        application.add_middleware(
+            LoadSheddingMiddleware,
+            initial_limit=settings.LOAD_SHEDDING_INITIAL_LIMIT,
+            min_limit=settings.LOAD_SHEDDING_MIN_LIMIT,
+            max_limit=settings.LOAD_SHEDDING_MAX_LIMIT,
+            latency_target=settings.LOAD_SHEDDING_LATENCY_TARGET,
+        )
+
     if isinstance(settings, EnvironmentSettings):
         if settings.ENVIRONMENT != EnvironmentOption.PRODUCTION:
             docs_router = APIRouter()
@@ -125,4 +240,4 @@ def create_application(
 
             application.include_router(docs_router)
 
-    return application
\ No newline at end of file
+    return application
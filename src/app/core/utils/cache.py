@@ -1,17 +1,386 @@
+import asyncio
+import bisect
+import contextlib
 import functools
+import inspect
+import itertools
 import json
-import re
-from collections.abc import Callable
-from typing import Any
+import math
+import os
+import random
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Collection, Iterator
+from dataclasses import dataclass
+from dataclasses import field as dataclass_field
+from fnmatch import fnmatchcase
+from string import Formatter
+from typing import Any, cast
 
 from fastapi import Request
 from fastapi.encoders import jsonable_encoder
 from redis.asyncio import ConnectionPool, Redis
-
-from ..exceptions.cache_exceptions import CacheIdentificationInferenceError, InvalidRequestError, MissingClientError
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db.database import local_session
+from ..exceptions.cache_exceptions import (
+    CacheIdentificationInferenceError,
+    CacheKeyTemplateError,
+    InvalidRequestError,
+    MissingClientError,
+)
+from ..exceptions.http_exceptions import NotFoundException
+from ..logger import logging
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None  # type: ignore
+
+logger = logging.getLogger(__name__)
 
 pool: ConnectionPool | None = None
 client: Redis | None = None
+invalidation_channel = "cache:invalidate"
+_instance_id = uuid.uuid4().hex
+
+
+class LocalCache:
+    """In-process LRU cache with per-entry TTL and a byte budget.
+
+    This is the optional first tier in front of Redis. Values are kept as the serialized bytes stored in Redis,
+    so the size of every entry is known exactly and the whole cache never holds more than `max_bytes`.
+
+    Parameters
+    ----------
+    max_bytes: int
+        The maximum number of bytes (keys plus values) held in memory.
+    max_entry_bytes: int | None, optional
+        Entries larger than this are never stored locally. Defaults to a quarter of `max_bytes`, so a single
+        large payload can not flush the rest of the cache.
+
+    Note
+    ----
+        - When an insert does not fit, expired entries are dropped first and then the least recently used
+          entries are evicted until the new entry fits.
+        - The cache is not shared between processes; every worker holds its own copy.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int | None = None) -> None:
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else max_bytes // 4
+        self.current_bytes = 0
+        self._entries: OrderedDict[str, tuple[bytes, float, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._remove(key)
+
+        size = len(key) + len(value)
+        if ttl <= 0 or size > self.max_entry_bytes:
+            return
+
+        if self.current_bytes + size > self.max_bytes:
+            self._evict(size)
+
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self.current_bytes += size
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._remove(key)
+
+    def delete_pattern(self, pattern: str) -> None:
+        """Delete every key matching a Redis-style glob pattern, e.g. 'user_*_items:*'."""
+        for key in [key for key in self._entries if fnmatchcase(key, pattern)]:
+            self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+    def _evict(self, needed: int) -> None:
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]:
+            self._remove(key)
+
+        while self._entries and self.current_bytes + needed > self.max_bytes:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+
+
+def _json_default(value: Any) -> Any:
+    return jsonable_encoder(value)
+
+
+class CacheCodec:
+    """Serialize cached values to bytes, optionally compressing large payloads.
+
+    Every payload starts with a two byte header naming its serializer and compression, so entries written with
+    another configuration are still decoded correctly while the configuration is being rolled out.
+
+    Parameters
+    ----------
+    serializer: str, optional
+        One of 'json' (standard library), 'orjson' or 'msgpack'. Defaults to 'json'.
+    compression: str | None, optional
+        One of 'zlib' (standard library), 'zstd' or 'lz4'. Defaults to None, which disables compression.
+    compression_threshold: int, optional
+        Payloads smaller than this many bytes are stored uncompressed. Defaults to 4096.
+
+    Note
+    ----
+        - Values are encoded directly; objects the serializer does not support natively, such as Pydantic models,
+          are converted with `jsonable_encoder` only where they occur.
+        - 'orjson', 'msgpack', 'zstd' and 'lz4' need the matching optional packages, see the `cache` extra.
+    """
+
+    _serializers = {"json": b"j", "orjson": b"j", "msgpack": b"m"}
+    _compressors = {None: b"-", "zlib": b"z", "zstd": b"s", "lz4": b"4"}
+    _modules = {"orjson": orjson, "msgpack": msgpack, "zstd": zstandard, "lz4": lz4}
+
+    def __init__(
+        self, serializer: str = "json", compression: str | None = None, compression_threshold: int = 4096
+    ) -> None:
+        if serializer not in self._serializers:
+            raise ValueError(f"Unknown cache serializer: {serializer}")
+        if compression not in self._compressors:
+            raise ValueError(f"Unknown cache compression: {compression}")
+        for name in (serializer, compression):
+            if name in self._modules and self._modules[name] is None:
+                raise ValueError(f"Cache codec '{name}' requires an optional package that is not installed.")
+
+        self.serializer = serializer
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+
+    def encode(self, value: Any) -> bytes:
+        data: bytes
+        if self.serializer == "msgpack":
+            data = msgpack.packb(value, default=_json_default)
+        elif self.serializer == "orjson":
+            data = orjson.dumps(value, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            data = json.dumps(value, default=_json_default, separators=(",", ":")).encode()
+
+        compression = self.compression if len(data) >= self.compression_threshold else None
+        if compression == "zlib":
+            data = zlib.compress(data)
+        elif compression == "zstd":
+            data = zstandard.ZstdCompressor().compress(data)
+        elif compression == "lz4":
+            data = lz4.frame.compress(data)
+
+        return self._serializers[self.serializer] + self._compressors[compression] + data
+
+    def decode(self, data: bytes) -> Any:
+        serializer, compression, payload = data[:1], data[1:2], data[2:]
+        if serializer not in (b"j", b"m"):
+            return json.loads(data)
+
+        if compression == b"z":
+            payload = zlib.decompress(payload)
+        elif compression == b"s":
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        elif compression == b"4":
+            payload = lz4.frame.decompress(payload)
+        elif compression != b"-":
+            raise ValueError(f"Unknown cache compression header: {compression!r}")
+
+        if serializer == b"m":
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+        return orjson.loads(payload) if orjson is not None else json.loads(payload)
+
+
+def _bucket_label(bound: float) -> str:
+    """Format a bucket bound exactly, e.g. "1048576" rather than the lossy "1.04858e+06" of `:g`."""
+    return str(int(bound)) if float(bound).is_integer() else repr(float(bound))
+
+
+class Histogram:
+    """Count observations in fixed buckets, laid out like a Prometheus histogram.
+
+    Parameters
+    ----------
+    buckets: tuple[float, ...]
+        Sorted upper bounds of the buckets. Observations above the last bound only count towards `+Inf`.
+    """
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextlib.contextmanager
+    def time(self) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at)
+
+    def as_dict(self) -> dict[str, Any]:
+        cumulative = list(itertools.accumulate(self.counts))
+        buckets = {_bucket_label(bound): count for bound, count in zip(self.buckets, cumulative)}
+        buckets["+Inf"] = self.count
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+_latency_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+_size_buckets = (256.0, 1024.0, 4096.0, 16384.0, 65536.0, 262144.0, 1048576.0)
+
+
+@dataclass
+class CacheStats:
+    local_hits: int = 0
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    refreshes: int = 0
+    redis_seconds: Histogram = dataclass_field(default_factory=lambda: Histogram(_latency_buckets))
+    codec_seconds: Histogram = dataclass_field(default_factory=lambda: Histogram(_latency_buckets))
+    payload_bytes: Histogram = dataclass_field(default_factory=lambda: Histogram(_size_buckets))
+
+    @property
+    def hit_ratio(self) -> float | None:
+        calls = self.local_hits + self.hits + self.misses + self.coalesced
+        return (self.local_hits + self.hits) / calls if calls else None
+
+
+local_cache: LocalCache | None = None
+codec = CacheCodec()
+cache_stats: dict[str, CacheStats] = {}
+
+_outcomes = ("local_hits", "hits", "misses", "coalesced")
+_counters = (*_outcomes, "refreshes")
+_histograms = {
+    "redis_seconds": "Latency of Redis reads and writes issued by cached endpoints.",
+    "codec_seconds": "Time spent serializing and deserializing cached values.",
+    "payload_bytes": "Size of the values written to the cache.",
+}
+
+
+def _stats_for(key_prefix: str) -> CacheStats:
+    stats = cache_stats.get(key_prefix)
+    if stats is None:
+        stats = cache_stats[key_prefix] = CacheStats()
+    return stats
+
+
+def get_cache_stats() -> dict[str, dict[str, Any]]:
+    """Return the counters and histograms of every cached endpoint, keyed by its `key_prefix` template.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]]
+        For each key prefix, the number of hits served from the local tier (`local_hits`), from Redis (`hits`),
+        the number of calls that had to run the endpoint (`misses`) and the number of calls that waited for
+        a concurrent miss on the same key instead of running the endpoint themselves (`coalesced`) and the number
+        of background refreshes started for stale or soon to expire entries (`refreshes`).
+        `hit_ratio` is None until the endpoint has been called. `redis_seconds`, `codec_seconds` and
+        `payload_bytes` are histograms with cumulative bucket counts.
+    """
+    return {
+        key_prefix: {
+            **{name: getattr(stats, name) for name in _counters},
+            "hit_ratio": stats.hit_ratio,
+            **{name: getattr(stats, name).as_dict() for name in _histograms},
+        }
+        for key_prefix, stats in cache_stats.items()
+    }
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_cache_metrics() -> str:
+    """Render the cache statistics in the Prometheus text exposition format.
+
+    Returns
+    -------
+    str
+        A `cache_requests_total` counter labelled by `key_prefix` and `outcome`, a `cache_refreshes_total`
+        counter of the background refreshes started, which are not calls of their own, followed by one
+        `cache_<histogram>` histogram per statistic in `get_cache_stats`. Every series is also labelled with
+        the `pid` of this worker, since the statistics are kept per process; aggregate them with e.g.
+        `sum without (pid)`.
+    """
+    pid = os.getpid()
+    lines = [
+        "# HELP cache_requests_total Calls to cached endpoints by outcome.",
+        "# TYPE cache_requests_total counter",
+    ]
+    for key_prefix, stats in cache_stats.items():
+        label = f'key_prefix="{_escape_label(key_prefix)}",pid="{pid}"'
+        for name in _outcomes:
+            lines.append(f'cache_requests_total{{{label},outcome="{name}"}} {getattr(stats, name)}')
+
+    lines.append("# HELP cache_refreshes_total Background refreshes of stale or soon to expire entries started.")
+    lines.append("# TYPE cache_refreshes_total counter")
+    for key_prefix, stats in cache_stats.items():
+        lines.append(f'cache_refreshes_total{{key_prefix="{_escape_label(key_prefix)}",pid="{pid}"}} {stats.refreshes}')
+
+    for name, description in _histograms.items():
+        lines.append(f"# HELP cache_{name} {description}")
+        lines.append(f"# TYPE cache_{name} histogram")
+        for key_prefix, stats in cache_stats.items():
+            label = f'key_prefix="{_escape_label(key_prefix)}",pid="{pid}"'
+            histogram = getattr(stats, name).as_dict()
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'cache_{name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f"cache_{name}_sum{{{label}}} {histogram['sum']}")
+            lines.append(f"cache_{name}_count{{{label}}} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
 
 
 def _infer_resource_id(kwargs: dict[str, Any], resource_id_type: type | tuple[type, ...]) -> int | str:
@@ -52,94 +421,143 @@ def _infer_resource_id(kwargs: dict[str, Any], resource_id_type: type | tuple[ty
     return resource_id
 
 
-def _extract_data_inside_brackets(input_string: str) -> list[str]:
-    """Extract data inside curly brackets from a given string using regular expressions.
+def _resolve_argument(kwargs: dict[str, Any], name: str) -> Any:
+    """Resolve an argument name, or a dotted path to one of its attributes, e.g. 'project.name'.
 
     Parameters
     ----------
-    input_string: str
-        The input string in which to find data enclosed within curly brackets.
+    kwargs: Dict[str, Any]
+        A dictionary of keyword arguments.
+    name: str
+        The argument name, optionally followed by attribute names separated by dots.
 
     Returns
     -------
-    List[str]
-        A list of strings containing the data found inside the curly brackets within the input string.
-
-    Example
-    -------
-    >>> _extract_data_inside_brackets("The {quick} brown {fox} jumps over the {lazy} dog.")
-    ['quick', 'fox', 'lazy']
+    Any: The value of the argument or of the attribute.
     """
-    data_inside_brackets = re.findall(r"{(.*?)}", input_string)
-    return data_inside_brackets
+    argument, *attributes = name.split(".")
+    value = kwargs[argument]
+    for attribute in attributes:
+        value = getattr(value, attribute)
+    return value
 
 
-def _construct_data_dict(data_inside_brackets: list[str], kwargs: dict[str, Any]) -> dict[str, Any]:
-    """Construct a dictionary based on data inside brackets and keyword arguments.
+class _KeyTemplate:
+    """A cache key template such as '{username}_posts:page_{page}', parsed once when the decorator is applied.
 
     Parameters
     ----------
-    data_inside_brackets: List[str]
-        A list of keys inside brackets.
-    kwargs: Dict[str, Any]
-        A dictionary of keyword arguments.
+    template: str
+        The template. Placeholders name arguments of the decorated function, or dotted paths to their attributes,
+        and may carry a format spec, e.g. '{page:03d}'.
 
-    Returns
+    Example
     -------
-    Dict[str, Any]: A dictionary with keys from data_inside_brackets and corresponding values from kwargs.
+    >>> _KeyTemplate("{username}_posts:page_{page}").format({"username": "alice", "page": 2})
+    'alice_posts:page_2'
     """
-    data_dict = {}
-    for key in data_inside_brackets:
-        data_dict[key] = kwargs[key]
-    return data_dict
 
+    def __init__(self, template: str) -> None:
+        self.template = template
+        self.parts = [(literal, field, spec) for literal, field, spec, _ in Formatter().parse(template)]
+        self.fields = [field for _, field, _ in self.parts if field is not None]
+
+    def format(self, kwargs: dict[str, Any]) -> str:
+        if not self.fields:
+            return self.template
+
+        return "".join(
+            literal if field is None else literal + format(_resolve_argument(kwargs, field), spec or "")
+            for literal, field, spec in self.parts
+        )
 
-def _format_prefix(prefix: str, kwargs: dict[str, Any]) -> str:
-    """Format a prefix using keyword arguments.
+    def validate(self, parameters: Collection[str], func_name: str) -> None:
+        """Raise `CacheKeyTemplateError` if a placeholder does not name a parameter of the decorated function."""
+        for field in self.fields:
+            if field.split(".")[0] not in parameters:
+                raise CacheKeyTemplateError(
+                    f"Cache key template '{self.template}' of '{func_name}' uses '{{{field}}}', "
+                    f"which is not a parameter of the function."
+                )
+
+
+def _invalidate_local(keys: list[str], patterns: list[str]) -> None:
+    if local_cache is None:
+        return
+
+    local_cache.delete(*keys)
+    for pattern in patterns:
+        local_cache.delete_pattern(pattern)
+
+
+async def _publish_invalidation(keys: list[str], patterns: list[str]) -> None:
+    """Evict keys from the local tier of this process and broadcast the eviction to every other worker.
 
     Parameters
     ----------
-    prefix: str
-        The prefix template to be formatted.
-    kwargs: Dict[str, Any]
-        A dictionary of keyword arguments.
+    keys: List[str]
+        The exact cache keys that were invalidated.
+    patterns: List[str]
+        Redis-style glob patterns of cache keys that were invalidated.
 
-    Returns
-    -------
-    str: The formatted prefix.
+    Note
+    ----
+        - Nothing is published when the local tier is disabled, since no process then holds a local copy.
+        - A failed publish is logged and not raised; the other workers fall back to `local_expiration`.
     """
-    data_inside_brackets = _extract_data_inside_brackets(prefix)
-    data_dict = _construct_data_dict(data_inside_brackets, kwargs)
-    formatted_prefix = prefix.format(**data_dict)
-    return formatted_prefix
+    if local_cache is None or client is None:
+        return
+
+    _invalidate_local(keys, patterns)
+    message = json.dumps({"origin": _instance_id, "keys": keys, "patterns": patterns})
+    try:
+        await client.publish(invalidation_channel, message)
+    except RedisError as e:
+        logger.warning(f"Could not broadcast cache invalidation: {e}")
 
 
-def _format_extra_data(to_invalidate_extra: dict[str, str], kwargs: dict[str, Any]) -> dict[str, Any]:
-    """Format extra data based on provided templates and keyword arguments.
+async def listen_for_invalidations(retry_interval: float = 1.0) -> None:
+    """Apply invalidations broadcast by other workers to the local tier of this process.
 
-    This function takes a dictionary of templates and their associated values and a dictionary of keyword arguments.
-    It formats the templates with the corresponding values from the keyword arguments and returns a dictionary
-    where keys are the formatted templates and values are the associated keyword argument values.
+    Meant to run as a background task for the lifetime of the application. When the subscription is lost, it is
+    retried every `retry_interval` seconds, and the whole local tier is cleared once subscribed again, since
+    messages published while disconnected are gone and entries may have been cached locally in the meantime.
+    A malformed message also clears the local tier, since the keys it meant to invalidate are unknown.
 
     Parameters
     ----------
-    to_invalidate_extra: Dict[str, str]
-        A dictionary where keys are templates and values are the associated values.
-    kwargs: Dict[str, Any]
-        A dictionary of keyword arguments.
-
-    Returns
-    -------
-        Dict[str, Any]: A dictionary where keys are formatted templates and values
-        are associated keyword argument values.
+    retry_interval: float, optional
+        Seconds to wait before subscribing again after a connection error. Defaults to 1 second.
     """
-    formatted_extra = {}
-    for prefix, id_template in to_invalidate_extra.items():
-        formatted_prefix = _format_prefix(prefix, kwargs)
-        id = _extract_data_inside_brackets(id_template)[0]
-        formatted_extra[formatted_prefix] = kwargs[id]
+    if client is None:
+        raise MissingClientError
 
-    return formatted_extra
+    reconnecting = False
+    while True:
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(invalidation_channel)
+            if reconnecting and local_cache is not None:
+                local_cache.clear()
+            reconnecting = False
+
+            async for message in pubsub.listen():
+                try:
+                    data = json.loads(message["data"])
+                    if data["origin"] != _instance_id:
+                        _invalidate_local(data["keys"], data["patterns"])
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Malformed cache invalidation message, clearing the local tier: {e}")
+                    if local_cache is not None:
+                        local_cache.clear()
+
+        except RedisError as e:
+            logger.warning(f"Cache invalidation subscription lost: {e}")
+            reconnecting = True
+            await asyncio.sleep(retry_interval)
+
+        finally:
+            await pubsub.aclose()  # type: ignore
 
 
 async def _delete_keys_by_pattern(pattern: str) -> None:
@@ -164,9 +582,8 @@ async def _delete_keys_by_pattern(pattern: str) -> None:
     - The SCAN command is used with a count of 100 to retrieve keys in batches.
       This count can be adjusted based on the size of your dataset and Redis performance.
 
-    - The function uses the delete command to remove keys in bulk. If the dataset
-      is extremely large, consider implementing additional logic to handle bulk deletion
-      more efficiently.
+    - The function uses the unlink command to remove each batch of keys, so the memory is reclaimed
+      in the background by Redis instead of blocking the server.
 
     - Be cautious with patterns that could match a large number of keys, as deleting
       many keys simultaneously may impact the performance of the Redis server.
@@ -178,7 +595,323 @@ async def _delete_keys_by_pattern(pattern: str) -> None:
     while cursor != 0:
         cursor, keys = await client.scan(cursor, match=pattern, count=100)
         if keys:
-            await client.delete(*keys)
+            await client.unlink(*keys)
+
+
+def _tag_key(tag: str) -> str:
+    return f"cache_tag:{tag}"
+
+
+async def _store(cache_key: str, data: bytes, expiration: int, tags: list[str]) -> None:
+    """Write a cache entry and record it under its tags in a single round trip.
+
+    A tag set's TTL is only ever extended, to the longest TTL of the keys written under it, so the set lives at
+    least as long as every entry it points to and a short-lived write, e.g. a cached not-found, cannot make it
+    expire before a long-lived one. EXPIRE NX and GT require Redis 7.
+    """
+    if client is None:
+        raise MissingClientError
+
+    async with client.pipeline(transaction=False) as pipe:
+        pipe.set(cache_key, data, ex=expiration)
+        for tag in tags:
+            pipe.sadd(_tag_key(tag), cache_key)
+            pipe.expire(_tag_key(tag), expiration, nx=True)
+            pipe.expire(_tag_key(tag), expiration, gt=True)
+        await pipe.execute()
+
+
+async def _unlink(keys: list[str], tags: list[str]) -> list[str]:
+    """Unlink keys and every key recorded under the given tags, in two round trips at most.
+
+    The keys are unlinked and the tag sets are read and dropped atomically in one pipeline; the members of the
+    tag sets are then removed with a single UNLINK.
+    """
+    if client is None:
+        raise MissingClientError
+
+    async with client.pipeline(transaction=True) as pipe:
+        if keys:
+            pipe.unlink(*keys)
+        for tag in tags:
+            pipe.smembers(_tag_key(tag))
+            pipe.unlink(_tag_key(tag))
+        results = await pipe.execute()
+
+    tag_results = results[1:] if keys else results
+    members = sorted({member.decode() for tag_members in tag_results[::2] for member in tag_members} - set(keys))
+    if members:
+        await client.unlink(*members)
+
+    return members
+
+
+async def invalidate_tags(*tags: str) -> list[str]:
+    """Delete every cache key recorded under the given tags.
+
+    The tag sets are read and dropped atomically in a single pipeline and their members are then removed with
+    one UNLINK, so the cost depends on the number of affected keys rather than on the size of the keyspace.
+    The invalidation is also broadcast to the local tier of every worker.
+
+    Parameters
+    ----------
+    *tags: str
+        The formatted tags to invalidate, e.g. 'alice_posts'.
+
+    Returns
+    -------
+    List[str]
+        The cache keys that were invalidated.
+    """
+    if not tags:
+        return []
+
+    keys = await _unlink([], list(tags))
+    await _publish_invalidation(keys, [])
+    return keys
+
+
+_inflight: dict[str, asyncio.Future] = {}
+
+_release_lock_script = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+async def _single_flight(key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+    """Run `load` once per key and process, sharing its outcome with every concurrent caller.
+
+    The first caller for a key becomes the leader and runs `load`; callers arriving while it is running
+    await the leader's result, or its exception, instead of running `load` themselves. If the leader is
+    cancelled, e.g. because its client disconnected, the first follower becomes the new leader and the others
+    follow it, so the cancellation does not spread to requests that were not cancelled themselves.
+    """
+    while (future := _inflight.get(key)) is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            task = asyncio.current_task()
+            if not future.cancelled() or (task is not None and task.cancelling()):
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    _inflight[key] = future
+    try:
+        result = await load()
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+async def _acquire_lock(key: str, lease: float) -> str | None:
+    if client is None:
+        raise MissingClientError
+
+    token = uuid.uuid4().hex
+    acquired = await client.set(f"cache_lock:{key}", token, nx=True, px=int(lease * 1000))
+    return token if acquired else None
+
+
+async def _release_lock(key: str, token: str) -> None:
+    if client is None:
+        raise MissingClientError
+
+    await client.eval(_release_lock_script, 1, f"cache_lock:{key}", token)  # type: ignore
+
+
+async def _wait_for_key(key: str, timeout: float, interval: float = 0.05) -> bytes | None:
+    """Poll Redis for a key until it exists, its lock is released, or `timeout` seconds have passed.
+
+    The lock holder releases the lock without writing the key when the endpoint raises, or returns a not-found
+    that is not cached, so waiting stops as soon as the lock is gone rather than when the lease runs out.
+    """
+    if client is None:
+        raise MissingClientError
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+        cached_data = await client.get(key)
+        if cached_data:
+            return cast(bytes, cached_data)
+
+        if not await client.exists(f"cache_lock:{key}"):
+            # The key may have been written between the two commands.
+            return cast(bytes | None, await client.get(key))
+
+    return None
+
+
+async def _read_entry(
+    key: str, local: LocalCache | None, local_ttl: float, use_envelope: bool, stats: CacheStats
+) -> dict[str, Any] | None:
+    """Read and decode a key from the local tier, falling back to Redis and copying a Redis hit into the local tier.
+
+    The local copy never outlives the Redis key, so it is capped by the remaining TTL of the key, read in the same
+    round trip as the value, which also bounds cached not-found outcomes by `not_found_expiration`. Entries that
+    can not be decoded are dropped from both tiers and read as a miss, so they are recomputed instead of failing
+    every request until they expire.
+    """
+    if client is None:
+        raise MissingClientError
+
+    data = local.get(key) if local is not None else None
+    from_local = data is not None
+    remaining_ms = None
+    if local is None:
+        with stats.redis_seconds.time():
+            data = await client.get(key)
+    elif data is None:
+        with stats.redis_seconds.time():
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                data, remaining_ms = await pipe.execute()
+    if not data:
+        return None
+
+    with stats.codec_seconds.time():
+        entry = _decode_entry(data, use_envelope)
+    if entry is None:
+        if local is not None:
+            local.delete(key)
+        await client.delete(key)
+        return None
+
+    if from_local:
+        stats.local_hits += 1
+        return entry
+
+    stats.hits += 1
+    if local is not None and remaining_ms is not None and (remaining_ms == -1 or remaining_ms > 0):
+        local.set(key, data, local_ttl if remaining_ms == -1 else min(local_ttl, remaining_ms / 1000))
+
+    return entry
+
+
+_background_tasks: set[asyncio.Task] = set()
+_not_found_marker = "__cache_not_found__"
+_envelope_version = 1
+
+
+def _validate_templates(func: Callable, templates: list[_KeyTemplate]) -> None:
+    """Check at decoration time that every template placeholder names a parameter of the decorated function."""
+    parameters = inspect.signature(func).parameters
+    if any(parameter.kind is inspect.Parameter.VAR_KEYWORD for parameter in parameters.values()):
+        return
+
+    for template in templates:
+        template.validate(parameters, func.__name__)
+
+
+async def _invalidate(
+    cache_key: str,
+    kwargs: dict[str, Any],
+    extra_templates: list[_KeyTemplate],
+    pattern_templates: list[_KeyTemplate],
+    tag_templates: list[_KeyTemplate],
+) -> None:
+    """Invalidate a cache key and everything the decorator was told to invalidate along with it."""
+    if client is None:
+        raise MissingClientError
+
+    invalidated_keys = [cache_key] + [template.format(kwargs) for template in extra_templates]
+    invalidated_keys += await _unlink(invalidated_keys, [template.format(kwargs) for template in tag_templates])
+
+    invalidated_patterns = [template.format(kwargs) + "*" for template in pattern_templates]
+    for pattern in invalidated_patterns:
+        await _delete_keys_by_pattern(pattern)
+
+    await _publish_invalidation(invalidated_keys, invalidated_patterns)
+
+
+def _encode_entry(value: Any, expiration: int, delta: float, use_envelope: bool) -> bytes:
+    if not use_envelope:
+        return codec.encode(value)
+
+    return codec.encode(
+        {"version": _envelope_version, "value": value, "expires_at": time.time() + expiration, "delta": delta}
+    )
+
+
+def _decode_entry(data: bytes | None, use_envelope: bool) -> dict[str, Any] | None:
+    """Decode a cached entry, or return None, a miss, when there is none or it can not be decoded as expected.
+
+    Entries written without an envelope, e.g. before `stale_ttl` was set on the endpoint, or with another envelope
+    version, are recomputed rather than failing the request.
+    """
+    if data is None:
+        return None
+
+    try:
+        entry = codec.decode(data)
+    except Exception as e:
+        logger.warning(f"Could not decode cached entry: {e}")
+        return None
+
+    if not use_envelope:
+        return {"value": entry}
+
+    if not isinstance(entry, dict) or entry.get("version") != _envelope_version:
+        return None
+
+    return entry
+
+
+def _unwrap(value: Any) -> Any:
+    """Return a cached value, raising `NotFoundException` again if a not-found outcome was cached."""
+    if isinstance(value, dict) and _not_found_marker in value:
+        raise NotFoundException(value[_not_found_marker])
+
+    return value
+
+
+def _needs_refresh(entry: dict[str, Any], beta: float | None) -> bool:
+    """Tell whether an entry is past its logical expiry or, with `beta`, due for an early refresh.
+
+    The early refresh follows the XFetch rule: refresh when `now - delta * beta * log(random())` reaches the
+    expiry, where `delta` is the time it took to compute the entry.
+    """
+    now = time.time()
+    if beta is not None:
+        now -= entry["delta"] * beta * math.log(1.0 - random.random())
+
+    return bool(now >= entry["expires_at"])
+
+
+def _refresh_in_background(key: str, load: Callable[[dict[str, Any]], Awaitable[Any]], kwargs: dict[str, Any]) -> bool:
+    """Recompute a cached entry in a background task, at most once per key and process at a time.
+
+    Returns whether a new refresh was started, False if the key is already being computed.
+    """
+    if key in _inflight:
+        return False
+
+    async def refresh() -> None:
+        async with local_session() as db:
+            call_kwargs = {name: db if isinstance(value, AsyncSession) else value for name, value in kwargs.items()}
+            try:
+                await _single_flight(key, functools.partial(load, call_kwargs))
+            except Exception as e:
+                logger.warning(f"Background refresh of cache key {key} failed: {e}")
+
+    task = asyncio.create_task(refresh())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return True
 
 
 def cache(
@@ -188,6 +921,12 @@ def cache(
     resource_id_type: type | tuple[type, ...] = int,
     to_invalidate_extra: dict[str, Any] | None = None,
     pattern_to_invalidate_extra: list[str] | None = None,
+    local_expiration: int | None = None,
+    tags: list[str] | None = None,
+    lock_timeout: float | None = None,
+    stale_ttl: int = 0,
+    early_refresh_beta: float | None = None,
+    not_found_expiration: int | None = None,
 ) -> Callable:
     """Cache decorator for FastAPI endpoints.
 
@@ -200,7 +939,9 @@ def cache(
         A unique prefix to identify the cache key.
     resource_id_name: Any, optional
         The name of the resource ID argument in the decorated function. If provided, it is used directly;
-        otherwise, the resource ID is inferred from the function's arguments.
+        otherwise, the resource ID is inferred from the function's arguments. A dotted path to an attribute of
+        an argument, e.g. 'project.name', is also accepted, which lets create endpoints invalidate the key
+        their resource will be read under.
     expiration: int, optional
         The expiration time for the cached data in seconds. Defaults to 3600 seconds (1 hour).
     resource_id_type: Union[type, Tuple[type, ...]], default int
@@ -213,6 +954,30 @@ def cache(
     pattern_to_invalidate_extra: List[str] | None, optional
         A list of string patterns for cache keys that should be invalidated when the decorated function is called.
         This allows for bulk invalidation of cache keys based on a matching pattern.
+    local_expiration: int | None, optional
+        If provided and the in-process `local_cache` is configured, GET responses are also kept in memory for
+        this many seconds (capped by `expiration`), so hot keys are served without a Redis round trip.
+        Defaults to None, which disables the local tier for the endpoint.
+    tags: List[str] | None, optional
+        A list of tag templates formatted with the function's arguments, e.g. '{username}_posts'.
+        On GET requests the cache key is recorded under each tag; on any other method every key recorded
+        under the tags is invalidated. This is the preferred alternative to `pattern_to_invalidate_extra`.
+    lock_timeout: float | None, optional
+        If provided, a cache miss also takes a Redis lock on the key with a lease of this many seconds, so only
+        one process across the deployment runs the endpoint. The others poll for the cached value until the
+        lease runs out or the lock is released without a value, e.g. because the endpoint raised, and then run
+        the endpoint themselves. Defaults to None, which only coalesces misses within the current process.
+    stale_ttl: int, optional
+        Number of seconds after `expiration` during which an expired entry is still served (stale-while-revalidate)
+        while a background task refreshes it. Defaults to 0, which makes `expiration` a hard TTL.
+    early_refresh_beta: float | None, optional
+        If provided, entries are refreshed in the background before they expire, with a probability that grows as
+        the expiry gets closer and with the time the endpoint took to compute (probabilistic early expiration,
+        "XFetch"). 1.0 is a good default; higher values refresh earlier. Defaults to None, which disables it.
+    not_found_expiration: int | None, optional
+        If provided, a `NotFoundException` raised by a GET endpoint is cached for this many seconds and raised
+        again, with the same detail, for every request of the key in that time. Keep it short, and make the
+        endpoint that creates the resource invalidate the key. Defaults to None, which caches successes only.
 
     Returns
     -------
@@ -279,54 +1044,116 @@ def cache(
     ----
     - resource_id_type is used only if resource_id is not passed.
     - `to_invalidate_extra` and `pattern_to_invalidate_extra` are used for cache invalidation on methods other than GET.
-    - Using `pattern_to_invalidate_extra` can be resource-intensive on large datasets. Use it judiciously and
-      consider the potential impact on Redis performance.
+    - Using `pattern_to_invalidate_extra` can be resource-intensive on large datasets, since it scans the whole
+      keyspace. Prefer `tags`, whose invalidation cost only depends on the number of affected keys.
+    - With `stale_ttl` or `early_refresh_beta`, entries are stored together with their logical expiry and compute
+      time. Background refreshes run with a new database session in place of any `AsyncSession` argument, since
+      the request's own session is closed once the response is sent.
+    - Key templates are parsed once when the decorator is applied, and a `CacheKeyTemplateError` is raised at
+      import time if a placeholder does not name a parameter of the decorated function.
+    - Concurrent GET misses on the same key within a process are coalesced: one request runs the endpoint and
+      the others await its result.
+    - Values are serialized with the module level `codec`, see `CacheCodec`. On a miss the endpoint's own return
+      value is returned, on a hit the decoded value.
+    - Hits, misses, Redis latency, codec time and payload sizes are recorded per `key_prefix` template, see
+      `get_cache_stats` and `render_cache_metrics`.
+    - Invalidation of the local tier is broadcast to every worker over the `invalidation_channel` pub/sub
+      channel, see `listen_for_invalidations`.
     """
+    local_ttl = min(local_expiration, expiration) if local_expiration is not None else 0
+    use_envelope = stale_ttl > 0 or early_refresh_beta is not None
+
+    key_template = _KeyTemplate(key_prefix)
+    extra_templates = [
+        _KeyTemplate(f"{prefix}:{{{_KeyTemplate(id_template).fields[0]}}}")
+        for prefix, id_template in (to_invalidate_extra or {}).items()
+    ]
+    pattern_templates = [_KeyTemplate(pattern) for pattern in pattern_to_invalidate_extra or []]
+    tag_templates = [_KeyTemplate(tag) for tag in tags or []]
+
+    templates = [key_template, *extra_templates, *pattern_templates, *tag_templates]
+    if resource_id_name:
+        templates.append(_KeyTemplate(f"{{{resource_id_name}}}"))
 
     def wrapper(func: Callable) -> Callable:
+        _validate_templates(func, templates)
+
         @functools.wraps(func)
         async def inner(request: Request, *args: Any, **kwargs: Any) -> Any:
             if client is None:
                 raise MissingClientError
 
             if resource_id_name:
-                resource_id = kwargs[resource_id_name]
+                resource_id = _resolve_argument(kwargs, resource_id_name)
             else:
                 resource_id = _infer_resource_id(kwargs=kwargs, resource_id_type=resource_id_type)
 
-            formatted_key_prefix = _format_prefix(key_prefix, kwargs)
+            formatted_key_prefix = key_template.format(kwargs)
             cache_key = f"{formatted_key_prefix}:{resource_id}"
+            local = local_cache if local_ttl > 0 else None
             if request.method == "GET":
                 if to_invalidate_extra is not None or pattern_to_invalidate_extra is not None:
                     raise InvalidRequestError
 
-                cached_data = await client.get(cache_key)
-                if cached_data:
-                    return json.loads(cached_data.decode())
-
-            result = await func(request, *args, **kwargs)
-
-            if request.method == "GET":
-                serializable_data = jsonable_encoder(result)
-                serialized_data = json.dumps(serializable_data)
-
-                await client.set(cache_key, serialized_data)
-                await client.expire(cache_key, expiration)
-
-                return json.loads(serialized_data)
+                stats = _stats_for(key_prefix)
+
+                async def load(call_kwargs: dict[str, Any]) -> Any:
+                    if client is None:
+                        raise MissingClientError
+
+                    lock_token = None
+                    if lock_timeout is not None:
+                        lock_token = await _acquire_lock(cache_key, lock_timeout)
+                        if lock_token is None:
+                            entry = _decode_entry(await _wait_for_key(cache_key, lock_timeout), use_envelope)
+                            if entry is not None:
+                                return _unwrap(entry["value"])
+
+                    formatted_tags = [template.format(call_kwargs) for template in tag_templates]
+
+                    async def store(value: Any, ttl: int, grace: int, delta: float) -> None:
+                        with stats.codec_seconds.time():
+                            serialized_data = _encode_entry(value, ttl, delta, use_envelope)
+                        stats.payload_bytes.observe(len(serialized_data))
+                        with stats.redis_seconds.time():
+                            await _store(cache_key, serialized_data, ttl + grace, formatted_tags)
+                        if local is not None:
+                            local.set(cache_key, serialized_data, min(local_ttl, ttl))
+
+                    try:
+                        started_at = time.monotonic()
+                        try:
+                            result = await func(request, *args, **call_kwargs)
+                        except NotFoundException as e:
+                            if not_found_expiration is not None:
+                                not_found = {_not_found_marker: e.detail}
+                                await store(not_found, not_found_expiration, 0, time.monotonic() - started_at)
+                            raise
+
+                        await store(result, expiration, stale_ttl, time.monotonic() - started_at)
+                        return result
+
+                    finally:
+                        if lock_token is not None:
+                            await _release_lock(cache_key, lock_token)
+
+                cached_entry = await _read_entry(cache_key, local, local_ttl, use_envelope, stats)
+                if cached_entry is not None:
+                    if use_envelope and _needs_refresh(cached_entry, early_refresh_beta):
+                        if _refresh_in_background(cache_key, load, kwargs):
+                            stats.refreshes += 1
+                    return _unwrap(cached_entry["value"])
+
+                if cache_key in _inflight:
+                    stats.coalesced += 1
+                else:
+                    stats.misses += 1
+
+                return await _single_flight(cache_key, functools.partial(load, kwargs))
 
             else:
-                await client.delete(cache_key)
-                if to_invalidate_extra is not None:
-                    formatted_extra = _format_extra_data(to_invalidate_extra, kwargs)
-                    for prefix, id in formatted_extra.items():
-                        extra_cache_key = f"{prefix}:{id}"
-                        await client.delete(extra_cache_key)
-
-                if pattern_to_invalidate_extra is not None:
-                    for pattern in pattern_to_invalidate_extra:
-                        formatted_pattern = _format_prefix(pattern, kwargs)
-                        await _delete_keys_by_pattern(formatted_pattern + "*")
+                result = await func(request, *args, **kwargs)
+                await _invalidate(cache_key, kwargs, extra_templates, pattern_templates, tag_templates)
 
             return result
 
@@ -1,18 +1,255 @@
-from datetime import UTC, datetime
-from typing import Optional
+import asyncio
+import math
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Optional, cast
 
 from redis.asyncio import ConnectionPool, Redis
+from redis.commands.core import AsyncScript
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...crud.crud_rate_limit import crud_rate_limits
+from ...crud.crud_tier import crud_tiers
+from ...schemas.rate_limit import RateLimitRead, sanitize_path
+from ...schemas.tier import TierRead
+from ..logger import logging
 
-from ...schemas.rate_limit import sanitize_path
+logger = logging.getLogger(__name__)
 
+# Every script takes KEYS[1], ARGV[1] = limit, ARGV[2] = period in milliseconds, ARGV[3] = a unique request id and
+# ARGV[4] = the number of requests to admit, reads the clock from the Redis server and admits as many of them as the
+# quota allows. It returns {granted, remaining, reset_after_ms, retry_after_ms}, where retry_after_ms is 0 unless
+# nothing was granted.
+_arguments = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local requested = tonumber(ARGV[4])
+"""
+
+_now = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+"""
+
+_fixed_window = """
+local count = tonumber(redis.call('GET', KEYS[1])) or 0
+local granted = math.max(0, math.min(requested, limit - count))
+if granted > 0 then
+    count = redis.call('INCRBY', KEYS[1], granted)
+end
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl == -1 then
+    redis.call('PEXPIRE', KEYS[1], period)
+end
+if ttl < 0 then
+    ttl = period
+end
+if granted == 0 then
+    return {0, 0, ttl, ttl}
+end
+return {granted, limit - count, ttl, 0}
+"""
+
+_sliding_window = """
+local window = math.floor(now / period)
+local elapsed = now - window * period
+local counts = redis.call('HMGET', KEYS[1], window - 1, window)
+local previous = tonumber(counts[1]) or 0
+local current = tonumber(counts[2]) or 0
+local estimate = math.floor(previous * (period - elapsed) / period) + current
+local granted = math.max(0, math.min(requested, limit - estimate))
+if granted == 0 then
+    local retry = period - elapsed
+    if current < limit and previous > 0 then
+        retry = math.max(1, math.ceil(period - elapsed - (limit - current) * period / previous))
+    end
+    return {0, 0, period - elapsed, retry}
+end
+redis.call('HINCRBY', KEYS[1], window, granted)
+redis.call('HDEL', KEYS[1], window - 2)
+redis.call('PEXPIRE', KEYS[1], 2 * period)
+return {granted, limit - estimate - granted, period - elapsed, 0}
+"""
+
+_sliding_log = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - period)
+local count = redis.call('ZCARD', KEYS[1])
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local reset = period
+if oldest[2] then
+    reset = tonumber(oldest[2]) + period - now
+end
+local granted = math.max(0, math.min(requested, limit - count))
+if granted == 0 then
+    return {0, 0, reset, reset}
+end
+for i = 1, granted do
+    redis.call('ZADD', KEYS[1], now, ARGV[3] .. ':' .. i)
+end
+redis.call('PEXPIRE', KEYS[1], period)
+return {granted, limit - count - granted, reset, 0}
+"""
+
+_token_bucket = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or limit
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - updated_at) * limit / period)
+local granted = math.max(0, math.min(requested, math.floor(tokens)))
+local retry = 0
+if granted == 0 then
+    retry = math.ceil((1 - tokens) * period / limit)
+end
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', now)
+redis.call('PEXPIRE', KEYS[1], period)
+return {granted, math.floor(tokens), math.ceil((limit - tokens) * period / limit), retry}
+"""
+
+_gcra = """
+local emission = period / limit
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local granted = math.max(0, math.min(requested, math.floor((now + period - tat) / emission + 1e-9)))
+if granted == 0 then
+    return {0, 0, math.ceil(tat - now), math.ceil(tat + emission - period - now)}
+end
+local new_tat = tat + granted * emission
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil(new_tat - now))
+return {granted, math.floor((now + period - new_tat) / emission + 1e-9), math.ceil(new_tat - now), 0}
+"""
+
+_scripts = {
+    "fixed_window": _arguments + _fixed_window,
+    "sliding_window": _arguments + _now + _sliding_window,
+    "sliding_log": _arguments + _now + _sliding_log,
+    "token_bucket": _arguments + _now + _token_bucket,
+    "gcra": _arguments + _now + _gcra,
+}
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Outcome of a single rate limit check.
+
+    Attributes
+    ----------
+    limited: bool
+        Whether the request exceeds the limit and must be rejected.
+    limit: int
+        The number of requests allowed per period.
+    remaining: int
+        The number of requests still allowed right now.
+    reset_after: float
+        Seconds until the quota is fully restored.
+    retry_after: float
+        Seconds until the next request would be allowed, 0 if this one was.
+    """
+
+    limited: bool
+    limit: int
+    remaining: int
+    reset_after: float
+    retry_after: float
+
+
+class LocalRateLimiter:
+    """Approximate, per-process sliding window limiter used while Redis is unavailable.
+
+    Parameters
+    ----------
+    max_keys: int, optional
+        Maximum number of keys tracked. The least recently used key is forgotten beyond that, which can only
+        make the limiter more permissive. Defaults to 10000.
+
+    Note
+    ----
+        - Counters are not shared between workers, so while Redis is down every worker applies the full limit
+          on its own.
+    """
+
+    def __init__(self, max_keys: int = 10_000) -> None:
+        self.max_keys = max_keys
+        self.counters: OrderedDict[str, tuple[int, int, int]] = OrderedDict()
+
+    def check(self, key: str, limit: int, period: int, requested: int = 1) -> tuple[RateLimitResult, int]:
+        now = time.time()
+        window = int(now // period)
+        elapsed = now - window * period
+
+        counted_window, current, previous = self.counters.pop(key, (window, 0, 0))
+        if counted_window == window - 1:
+            current, previous = 0, current
+        elif counted_window != window:
+            current, previous = 0, 0
+
+        estimate = math.floor(previous * (period - elapsed) / period) + current
+        granted = max(0, min(requested, limit - estimate))
+        self.counters[key] = (window, current + granted, previous)
+        if len(self.counters) > self.max_keys:
+            self.counters.popitem(last=False)
+
+        result = RateLimitResult(
+            limited=granted == 0,
+            limit=limit,
+            remaining=max(0, limit - estimate - granted),
+            reset_after=period - elapsed,
+            retry_after=period - elapsed if granted == 0 else 0.0,
+        )
+        return result, granted
+
+    def clear(self) -> None:
+        self.counters.clear()
+
+
+@dataclass
+class _Lease:
+    tokens: int
+    expires_at: float
+    remaining: int
+    reset_at: float
 
 
 class RateLimiter:
+    """Rate limiter backed by Redis, evaluating one Lua script per check.
+
+    The algorithm is chosen at initialization:
+
+    - 'fixed_window': counts requests per period, allowing bursts of up to twice the limit around window edges.
+    - 'sliding_window': weights the previous window's count by its overlap with the trailing period.
+    - 'sliding_log': records the timestamp of every accepted request, exact but O(limit) memory per key.
+    - 'token_bucket': refills `limit` tokens per period, allowing bursts of up to `limit` requests.
+    - 'gcra': generic cell rate algorithm, equivalent to a token bucket with a single timestamp of state.
+
+    Every script runs atomically on the server with the server's clock, so the check and the expiry of its key
+    cannot be separated by a crash and replicas do not need synchronized clocks.
+
+    With a `lease_fraction` above 0, each worker reserves `ceil(limit * lease_fraction)` requests at a time and
+    admits them locally, so only one request per chunk reaches Redis. Unused reservations are dropped after
+    `period * lease_fraction` seconds. Concurrent requests for a key wait for a lease being acquired rather than
+    leasing chunks of their own. A lease can be spent after the window it was counted in has rolled over, so
+    across all workers the limit can be exceeded by at most one chunk per worker and key, while within a window
+    reservations held by idle workers may reject requests early.
+
+    If Redis cannot be reached, requests are limited per process by a `LocalRateLimiter` instead of failing, and
+    Redis is retried every `retry_interval` seconds. Once it answers again the local counters are dropped and Redis
+    is authoritative again.
+    """
+
     _instance: Optional["RateLimiter"] = None
     pool: Optional[ConnectionPool] = None
     client: Optional[Redis] = None
+    algorithm: str = "sliding_window"
+    scripts: dict[str, AsyncScript] = {}
+    lease_fraction: float = 0.0
+    leases: dict[str, _Lease] = {}
+    pending_leases: dict[str, asyncio.Future] = {}
+    max_leases: int = 10_000
+    fallback: LocalRateLimiter = LocalRateLimiter()
+    retry_interval: float = 5.0
+    unavailable_until: float = 0.0
 
     def __new__(cls) -> "RateLimiter":
         if cls._instance is None:
@@ -20,11 +257,29 @@ class RateLimiter:
         return cls._instance
 
     @classmethod
-    def initialize(cls, redis_url: str) -> None:
+    def initialize(cls, redis_url: str, algorithm: str = "sliding_window", lease_fraction: float = 0.0) -> None:
+        if algorithm not in _scripts:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        if not 0 <= lease_fraction <= 1:
+            raise ValueError(f"Rate limit lease fraction must be between 0 and 1, got {lease_fraction}")
+
         instance = cls()
+        instance.algorithm = algorithm
+        instance.lease_fraction = lease_fraction
+        instance.leases = {}
         if instance.pool is None:
             instance.pool = ConnectionPool.from_url(redis_url)
             instance.client = Redis(connection_pool=instance.pool)
+            instance.scripts = {name: instance.client.register_script(script) for name, script in _scripts.items()}
+
+    @classmethod
+    async def close(cls) -> None:
+        instance = cls()
+        if instance.client is not None:
+            await instance.client.aclose()  # type: ignore
+        instance.pool = None
+        instance.client = None
+        instance.scripts = {}
 
     @classmethod
     def get_client(cls) -> Redis:
@@ -34,27 +289,187 @@ class RateLimiter:
             raise Exception("Redis client is not initialized.")
         return instance.client
 
-    async def is_rate_limited(self, db: AsyncSession, user_id: int, path: str, limit: int, period: int) -> bool:
-        client = self.get_client()
-        current_timestamp = int(datetime.now(UTC).timestamp())
-        window_start = current_timestamp - (current_timestamp % period)
+    async def check(self, user_id: int | str, path: str, limit: int, period: int) -> RateLimitResult:
+        """Count a request against the limit of `user_id` on `path` and report the remaining quota.
+
+        Parameters
+        ----------
+        user_id: int | str
+            The id of the user, or the client address for anonymous requests.
+        path: str
+            The request path.
+        limit: int
+            The number of requests allowed per period.
+        period: int
+            The period in seconds.
+
+        Returns
+        -------
+        RateLimitResult
+            Whether the request is limited, with the remaining quota and when it resets.
+        """
+        key = f"ratelimit:{self.algorithm}:{user_id}:{sanitize_path(path)}"
+        if self.lease_fraction <= 0:
+            result, _ = await self._evaluate(key, limit, period, requested=1)
+            return result
+
+        while True:
+            now = time.monotonic()
+            lease = self.leases.get(key)
+            if lease is not None and lease.tokens > 0 and lease.expires_at > now:
+                lease.tokens -= 1
+                return RateLimitResult(
+                    limited=False,
+                    limit=limit,
+                    remaining=lease.remaining + lease.tokens,
+                    reset_after=max(0.0, lease.reset_at - now),
+                    retry_after=0.0,
+                )
+
+            pending = self.pending_leases.get(key)
+            if pending is None:
+                break
+            await asyncio.wait([pending])
 
-        sanitized_path = sanitize_path(path)
-        key = f"ratelimit:{user_id}:{sanitized_path}:{window_start}"
+        return await self._lease(key, limit, period)
 
+    async def _lease(self, key: str, limit: int, period: int) -> RateLimitResult:
+        pending = asyncio.get_running_loop().create_future()
+        self.pending_leases[key] = pending
         try:
-            current_count = await client.incr(key)
-            if current_count == 1:
-                await client.expire(key, period)
+            now = time.monotonic()
+            result, granted = await self._evaluate(
+                key, limit, period, requested=max(1, math.ceil(limit * self.lease_fraction))
+            )
+            if granted > 1:
+                self._store_lease(
+                    key,
+                    _Lease(
+                        tokens=granted - 1,
+                        expires_at=now + period * self.lease_fraction,
+                        remaining=result.remaining,
+                        reset_at=now + result.reset_after,
+                    ),
+                )
+                return replace(result, remaining=result.remaining + granted - 1)
 
-            if current_count > limit:
-                return True
+            return result
 
+        finally:
+            del self.pending_leases[key]
+            pending.set_result(None)
+
+    async def _evaluate(self, key: str, limit: int, period: int, requested: int) -> tuple[RateLimitResult, int]:
+        if self.client is None or time.monotonic() < self.unavailable_until:
+            return self.fallback.check(key, limit, period, requested)
+
+        try:
+            reply: list[Any] = await self.scripts[self.algorithm](
+                keys=[key], args=[limit, period * 1000, uuid.uuid4().hex, requested]
+            )
+        except RedisError as e:
+            logger.warning(f"Redis is unavailable for rate limiting, limiting per process for now: {e}")
+            self.unavailable_until = time.monotonic() + self.retry_interval
+            return self.fallback.check(key, limit, period, requested)
         except Exception as e:
-            logger.exception(f"Error checking rate limit for user {user_id} on path {path}: {e}")
+            logger.exception(f"Error checking rate limit for key {key}: {e}")
             raise e
 
-        return False
+        if self.fallback.counters:
+            self.fallback.clear()
+
+        granted, remaining, reset_after, retry_after = (int(value) for value in reply)
+        result = RateLimitResult(
+            limited=granted == 0,
+            limit=limit,
+            remaining=max(0, remaining),
+            reset_after=reset_after / 1000,
+            retry_after=retry_after / 1000,
+        )
+        return result, granted
+
+    def _store_lease(self, key: str, lease: _Lease) -> None:
+        if len(self.leases) >= self.max_leases:
+            now = time.monotonic()
+            self.leases = {key: lease for key, lease in self.leases.items() if lease.expires_at > now}
+            if len(self.leases) >= self.max_leases:
+                self.leases.clear()
+        self.leases[key] = lease
+
+    async def is_rate_limited(self, db: AsyncSession, user_id: int, path: str, limit: int, period: int) -> bool:
+        result = await self.check(user_id=user_id, path=path, limit=limit, period=period)
+        return result.limited
+
+
+class RateLimitPolicies:
+    """In-memory copy of the tier names and rate limits, keyed by tier id and sanitized path.
+
+    Parameters
+    ----------
+    max_age: float, optional
+        Seconds after which the table is reloaded from the database, so changes made through another
+        process are picked up. Defaults to 60.
+
+    Note
+    ----
+        - The table is loaded lazily on first use and reloaded after `invalidate`, which the tier and rate limit
+          write endpoints call. Concurrent reloads are serialized so only one of them queries the database.
+    """
+
+    def __init__(self, max_age: float = 60.0) -> None:
+        self.max_age = max_age
+        self.tiers: dict[int, str] = {}
+        self.limits: dict[tuple[int, str], tuple[int, int]] = {}
+        self.loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def _is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.max_age
+
+    async def load(self, db: AsyncSession) -> None:
+        tiers = await crud_tiers.get_multi(db=db, limit=None, schema_to_select=TierRead, return_total_count=False)
+        rate_limits = await crud_rate_limits.get_multi(
+            db=db, limit=None, schema_to_select=RateLimitRead, return_total_count=False
+        )
+
+        self.tiers = {tier["id"]: tier["name"] for tier in cast(list[dict[str, Any]], tiers["data"])}
+        self.limits = {
+            (rate_limit["tier_id"], rate_limit["path"]): (rate_limit["limit"], rate_limit["period"])
+            for rate_limit in cast(list[dict[str, Any]], rate_limits["data"])
+        }
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self.loaded_at = None
+
+    async def get(self, db: AsyncSession, tier_id: int | None, path: str) -> tuple[str | None, tuple[int, int] | None]:
+        """Return the name of the tier and its `(limit, period)` for the sanitized `path`.
+
+        Parameters
+        ----------
+        db: AsyncSession
+            Session used to reload the table if it is stale.
+        tier_id: int | None
+            The tier of the user.
+        path: str
+            The sanitized request path.
+
+        Returns
+        -------
+        tuple[str | None, tuple[int, int] | None]
+            The tier name, or None if the tier does not exist, and the rate limit, or None if the tier
+            has no rate limit for the path.
+        """
+        if self._is_stale():
+            async with self._lock:
+                if self._is_stale():
+                    await self.load(db)
+
+        if tier_id is None:
+            return None, None
+
+        return self.tiers.get(tier_id), self.limits.get((tier_id, path))
 
 
 rate_limiter = RateLimiter()
+rate_limit_policies = RateLimitPolicies()
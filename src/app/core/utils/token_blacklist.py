@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import math
+import time
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any, cast
+
+from jose import JWTError, jwt
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db.crud_token_blacklist import crud_token_blacklist
+from ..db.database import local_session
+from ..logger import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Set membership with no false negatives and a bounded rate of false positives.
+
+    Parameters
+    ----------
+    capacity: int
+        Number of items the filter is sized for.
+    error_rate: float
+        False positive rate at `capacity` items. It grows beyond that, membership stays exact for added items.
+    """
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def token_id(token: str, payload: dict[str, Any]) -> str:
+    """The `jti` claim of a token, or the SHA-256 of the token for tokens issued without one."""
+    jti = payload.get("jti")
+    if jti is None:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    return str(jti)
+
+
+class TokenBlacklist:
+    """Revoked tokens, in Redis keyed by `jti` and pre-checked against an in-process Bloom filter.
+
+    Parameters
+    ----------
+    capacity: int, optional
+        Number of unexpired revoked tokens the Bloom filter is sized for. Defaults to 100000.
+    error_rate: float, optional
+        False positive rate of the Bloom filter at `capacity`. Defaults to 0.01.
+    channel: str, optional
+        Redis pub/sub channel revocations are broadcast on. Defaults to "token_blacklist:revoked".
+    rebuild_interval: float, optional
+        Seconds between rebuilds of the Bloom filter, which drop expired tokens from it. Defaults to 3600.
+
+    Note
+    ----
+        - A token absent from the Bloom filter is not revoked, so verifying it costs no I/O. A token present in it
+          is looked up in Redis, and only in Postgres, which stays the durable log, when Redis is unavailable.
+        - Every worker subscribes to `channel` and adds the tokens revoked by the others to its filter. The filter
+          is only trusted while subscribed: before the first load and after losing the subscription, every
+          lookup goes to Redis or Postgres until the filter is rebuilt from Postgres.
+        - `on_revoke` is called with the SHA-256 of each token revoked by any worker, so per-process caches of
+          verified tokens can drop it.
+        - Revocations that could not be written to Redis or broadcast are kept in `pending` and retried by
+          `listen` every second until they succeed or the token expires, so other workers do not keep accepting
+          a logged out token until their next rebuild.
+        - The client must point to a Redis that never evicts keys, not to an LRU cache instance.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 100_000,
+        error_rate: float = 0.01,
+        channel: str = "token_blacklist:revoked",
+        rebuild_interval: float = 3600,
+    ) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.channel = channel
+        self.rebuild_interval = rebuild_interval
+        self.client: Redis | None = None
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.ready = False
+        self.on_revoke: Callable[[str], None] | None = None
+        self.pending: dict[str, tuple[str, float]] = {}
+
+    @staticmethod
+    def _key(jti: str) -> str:
+        return f"token_blacklist:{jti}"
+
+    async def load(self, db: AsyncSession) -> None:
+        """Rebuild the Bloom filter from the unexpired tokens in Postgres, and restore their Redis keys."""
+        result = await crud_token_blacklist.get_multi(
+            db, limit=None, expires_at__gt=datetime.fromtimestamp(time.time()), return_total_count=False
+        )
+        rows = cast(list[dict[str, Any]], result["data"])
+
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        entries = []
+        for row in rows:
+            try:
+                jti = token_id(row["token"], jwt.get_unverified_claims(row["token"]))
+            except JWTError:
+                continue
+            bloom.add(jti)
+            entries.append((jti, row["expires_at"].timestamp()))
+
+        if self.client is not None and entries:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for jti, exp in entries:
+                    pipe.set(self._key(jti), 1, ex=max(1, math.ceil(exp - time.time())))
+                await pipe.execute()
+
+        self.bloom = bloom
+        self.ready = True
+
+    async def revoke(self, token: str, jti: str, exp: float) -> None:
+        """Add a token to the Bloom filter and to Redis until it expires, and broadcast it to the other workers.
+
+        Parameters
+        ----------
+        token: str
+            The revoked token.
+        jti: str
+            Its identifier, see `token_id`.
+        exp: float
+            Its expiry, as a Unix timestamp.
+        """
+        self.bloom.add(jti)
+        if self.client is None:
+            return
+
+        self.pending[jti] = (hashlib.sha256(token.encode()).hexdigest(), exp)
+        try:
+            await self.flush()
+        except RedisError as e:
+            logger.warning(f"Could not add token to the Redis blacklist, retrying in the background: {e}")
+
+    async def flush(self) -> None:
+        """Write the pending revocations to Redis and broadcast them, keeping them pending if Redis fails."""
+        now = time.time()
+        for jti in [jti for jti, (_, exp) in self.pending.items() if exp <= now]:
+            del self.pending[jti]
+        if self.client is None or not self.pending:
+            return
+
+        batch = dict(self.pending)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for jti, (token_hash, exp) in batch.items():
+                pipe.set(self._key(jti), 1, ex=max(1, math.ceil(exp - now)))
+                pipe.publish(self.channel, json.dumps({"jti": jti, "token_hash": token_hash}))
+            await pipe.execute()
+
+        for jti in batch:
+            self.pending.pop(jti, None)
+
+    async def is_revoked(self, jti: str, token: str, db: AsyncSession) -> bool:
+        if self.ready and jti not in self.bloom:
+            return False
+
+        if self.client is not None:
+            try:
+                return bool(await self.client.exists(self._key(jti)))
+            except RedisError as e:
+                logger.warning(f"Redis blacklist unavailable, checking the database: {e}")
+
+        return bool(await crud_token_blacklist.exists(db, token=token))
+
+    def _apply(self, message: dict[str, Any]) -> None:
+        data = json.loads(message["data"])
+        self.bloom.add(data["jti"])
+        if self.on_revoke is not None:
+            self.on_revoke(data["token_hash"])
+
+    async def listen(self, retry_interval: float = 1.0) -> None:
+        """Keep the Bloom filter in sync with the revocations of every worker.
+
+        Meant to run as a background task for the lifetime of the application. The filter is built from Postgres
+        once subscribed, so no revocation published in between is missed. Revocations of this worker come back
+        through the channel too, so none made while the filter is being rebuilt is lost. The filter is rebuilt
+        every `rebuild_interval` seconds, dropping expired tokens, and after each lost subscription. Pending
+        revocations of this worker are retried every second.
+
+        Parameters
+        ----------
+        retry_interval: float, optional
+            Seconds to wait before subscribing again after an error, from Redis or from loading the database.
+            Defaults to 1 second.
+        """
+        if self.client is None:
+            raise ValueError("Redis client is not initialized for the token blacklist.")
+
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                while True:
+                    async with local_session() as db:
+                        await self.load(db)
+                    rebuild_at = time.monotonic() + self.rebuild_interval
+                    while time.monotonic() < rebuild_at:
+                        message = await pubsub.get_message(timeout=1.0)
+                        if message is not None:
+                            self._apply(message)
+                        await self.flush()
+
+            except RedisError as e:
+                logger.warning(f"Token blacklist subscription lost: {e}")
+                await asyncio.sleep(retry_interval)
+
+            except Exception as e:
+                logger.exception(f"Token blacklist sync failed: {e}")
+                await asyncio.sleep(retry_interval)
+
+            finally:
+                self.ready = False
+                await pubsub.aclose()  # type: ignore
+
+
+token_blacklist = TokenBlacklist()
@@ -1,14 +1,74 @@
 import asyncio
-
+import time
+from datetime import datetime
+from typing import Any
 
 import uvloop
 from arq.worker import Worker
+from sqlalchemy import delete, select
+
+from ...core.config import settings
+from ...core.db.database import local_session
+from ...core.db.token_blacklist import TokenBlacklist
+from ...core.logger import logging
 
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
+logger = logging.getLogger(__name__)
+
 
 # -------- background tasks --------
 async def sample_background_task(ctx: Worker, name: str) -> str:
     await asyncio.sleep(5)
     return f"Task {name} is complete!"
 
+
+async def purge_expired_tokens(ctx: dict[str, Any], batch_size: int | None = None) -> dict[str, Any]:
+    """Delete blacklisted tokens past their expiry, which can no longer be used anyway.
+
+    Rows are deleted `batch_size` at a time, each batch in its own transaction, so the purge never holds long locks
+    on the table `verify_token` falls back to.
+
+    Parameters
+    ----------
+    ctx: dict[str, Any]
+        The arq job context.
+    batch_size: int | None, optional
+        Rows deleted per transaction. Defaults to `TOKEN_BLACKLIST_PURGE_BATCH_SIZE`.
+
+    Returns
+    -------
+    dict[str, Any]
+        `purged`, the number of rows deleted, and `seconds`, the time taken.
+    """
+    batch_size = batch_size or settings.TOKEN_BLACKLIST_PURGE_BATCH_SIZE
+    started_at = time.perf_counter()
+    now = datetime.fromtimestamp(time.time())
+    purged = 0
+
+    async with local_session() as db:
+        while True:
+            result = await db.execute(
+                select(TokenBlacklist.id).where(TokenBlacklist.expires_at < now).limit(batch_size)
+            )
+            ids = list(result.scalars().all())
+            if ids:
+                await db.execute(delete(TokenBlacklist).where(TokenBlacklist.id.in_(ids)))
+                await db.commit()
+                purged += len(ids)
+
+            if len(ids) < batch_size:
+                break
+
+    seconds = time.perf_counter() - started_at
+    logger.info(f"Purged {purged} expired tokens from the blacklist in {seconds:.3f}s")
+    return {"purged": purged, "seconds": seconds}
+
+
+# -------- base functions --------
+async def startup(ctx: Worker) -> None:
+    logger.info("Worker Started")
+
+
+async def shutdown(ctx: Worker) -> None:
+    logger.info("Worker end")
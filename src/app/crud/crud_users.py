@@ -1,7 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Any, cast
+
 from fastcrud import FastCRUD
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..core.config import settings
 from ..models.user import User
-from ..schemas.user import UserCreateInternal, UserDelete, UserRead, UserUpdate, UserUpdateInternal
+from ..schemas.user import UserCreateInternal, UserDelete, UserRead, UserSummary, UserUpdate, UserUpdateInternal
 
 CRUDUser = FastCRUD[User, UserCreateInternal, UserUpdate, UserUpdateInternal, UserDelete, UserRead]
 crud_users = CRUDUser(User)
+
+
+class UserLookupCache:
+    """In-process cache of users by username, for handlers that only need to resolve a username.
+
+    Parameters
+    ----------
+    ttl: float
+        Seconds an entry is kept. 0 disables the cache.
+    max_entries: int, optional
+        Maximum number of cached users, the least recently used is dropped beyond that. Defaults to 10000.
+
+    Note
+    ----
+        - Entries hold the `UserRead` fields plus `is_deleted`, so one entry serves lookups with and without
+          soft-deleted users. Unknown usernames are not cached, so new users resolve immediately.
+        - User updates and deletions invalidate the entry of the worker handling them. Other workers may keep
+          serving the previous entry for up to `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 10_000) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+
+    async def get(self, db: AsyncSession, username: str, include_deleted: bool = False) -> dict[str, Any] | None:
+        """Get the `UserRead` fields of a user by username, from the cache or the database.
+
+        Parameters
+        ----------
+        db: AsyncSession
+            Database session, only used on a cache miss.
+        username: str
+            The username to look up.
+        include_deleted: bool, optional
+            Whether soft-deleted users are returned. Defaults to False.
+
+        Returns
+        -------
+        dict[str, Any] | None
+            The user, or None if not found.
+        """
+        entry = self.entries.get(username)
+        if entry is not None and entry[1] > time.monotonic():
+            self.entries.move_to_end(username)
+            user = entry[0]
+        else:
+            db_user = await crud_users.get(db=db, username=username, schema_to_select=UserSummary)
+            if db_user is None:
+                self.entries.pop(username, None)
+                return None
+
+            user = cast(dict[str, Any], db_user)
+            self.set(username, user)
+
+        if user["is_deleted"] and not include_deleted:
+            return None
+
+        return {key: value for key, value in user.items() if key != "is_deleted"}
+
+    def set(self, username: str, user: dict[str, Any]) -> None:
+        if self.ttl <= 0:
+            return
+
+        self.entries.pop(username, None)
+        self.entries[username] = (dict(user), time.monotonic() + self.ttl)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, username: str) -> None:
+        self.entries.pop(username, None)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+user_lookup_cache = UserLookupCache(ttl=settings.USER_CACHE_TTL_SECONDS, max_entries=settings.USER_CACHE_MAX_ENTRIES)
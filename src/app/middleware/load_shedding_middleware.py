@@ -0,0 +1,154 @@
+import json
+import re
+import time
+from enum import Enum
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class Priority(Enum):
+    CRITICAL = "critical"
+    HIGH = "high"
+    NORMAL = "normal"
+    LOW = "low"
+
+
+# Share of the concurrency limit each priority may use, so lower priorities are shed first as load grows.
+PRIORITY_SHARES = {Priority.CRITICAL: 1.0, Priority.HIGH: 0.9, Priority.NORMAL: 0.75, Priority.LOW: 0.5}
+
+# (methods, path pattern, priority), the first matching rule wins and unmatched requests are NORMAL.
+DEFAULT_PRIORITY_RULES: list[tuple[set[str] | None, re.Pattern[str], Priority]] = [
+    ({"POST"}, re.compile(r"^/api/v1/(login2?|refresh|logout)$"), Priority.CRITICAL),
+    ({"POST", "PATCH", "PUT", "DELETE"}, re.compile(r"^/api/v1/"), Priority.HIGH),
+    (
+        {"GET"},
+        re.compile(
+            r"^/api/v1/(projects|buildings|buildinglevels|buildingsides|buildingtypes|categories|subcategories"
+            r"|defect|defecttypes|users|tiers|[^/]+/posts)$"
+        ),
+        Priority.LOW,
+    ),
+]
+
+
+class AdaptiveConcurrencyLimit:
+    """Concurrency limit adjusted with additive increase, multiplicative decrease (AIMD) on observed latency.
+
+    Parameters
+    ----------
+    initial_limit: int
+        Concurrency limit to start with.
+    min_limit: int
+        The limit never drops below this.
+    max_limit: int
+        The limit never grows beyond this.
+    latency_target: float
+        Seconds. Requests completing within it grow the limit by about one per limit's worth of requests, slower
+        requests shrink it by `backoff`, at most once per `latency_target`.
+    backoff: float, optional
+        Factor applied to the limit on a slow request. Defaults to 0.9.
+    """
+
+    def __init__(
+        self, initial_limit: int, min_limit: int, max_limit: int, latency_target: float, backoff: float = 0.9
+    ) -> None:
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.in_flight = 0
+        self._decreased_at = 0.0
+
+    def try_acquire(self, priority: Priority) -> bool:
+        if self.in_flight >= max(1, int(self.limit * PRIORITY_SHARES[priority])):
+            return False
+
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float) -> None:
+        self.in_flight -= 1
+        now = time.monotonic()
+        if latency > self.latency_target:
+            if now - self._decreased_at > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._decreased_at = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+class LoadSheddingMiddleware:
+    """Middleware to reject requests with a 503 when the process is at its adaptive concurrency limit.
+
+    Parameters
+    ----------
+    app: ASGIApp
+        The ASGI application to wrap.
+    initial_limit: int, optional
+        Concurrency limit to start with. Defaults to 15, the size of the default database connection pool.
+    min_limit: int, optional
+        Defaults to 5.
+    max_limit: int, optional
+        Defaults to 100.
+    latency_target: float, optional
+        Seconds, see `AdaptiveConcurrencyLimit`. Defaults to 0.5.
+    priority_rules: list, optional
+        `(methods, path pattern, priority)` rules, defaults to `DEFAULT_PRIORITY_RULES`.
+
+    Note
+    ----
+        - Requests are rejected immediately instead of being queued, so an overload spike turns into fast 503s
+          with `Retry-After` rather than every request timing out while waiting for a database connection.
+        - Each priority may only use its share of the limit, see `PRIORITY_SHARES`, so list endpoints are shed
+          before inspection writes and login is shed last.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        initial_limit: int = 15,
+        min_limit: int = 5,
+        max_limit: int = 100,
+        latency_target: float = 0.5,
+        priority_rules: list[tuple[set[str] | None, re.Pattern[str], Priority]] | None = None,
+    ) -> None:
+        self.app = app
+        self.concurrency = AdaptiveConcurrencyLimit(initial_limit, min_limit, max_limit, latency_target)
+        self.priority_rules = DEFAULT_PRIORITY_RULES if priority_rules is None else priority_rules
+
+    def priority_of(self, method: str, path: str) -> Priority:
+        for methods, pattern, priority in self.priority_rules:
+            if (methods is None or method in methods) and pattern.match(path):
+                return priority
+
+        return Priority.NORMAL
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if not self.concurrency.try_acquire(self.priority_of(scope["method"], scope["path"])):
+            await self.reject(send)
+            return
+
+        started_at = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.concurrency.release(time.monotonic() - started_at)
+
+    async def reject(self, send: Send) -> None:
+        body = json.dumps({"detail": "Service is overloaded, please retry later."}).encode()
+        start: Message = {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", b"1"),
+            ],
+        }
+        await send(start)
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,69 @@
+import math
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..core.utils.rate_limit import RateLimitResult
+
+
+def rate_limit_headers(result: RateLimitResult) -> dict[str, str]:
+    """Build the rate limit response headers for the outcome of a rate limit check.
+
+    Parameters
+    ----------
+    result: RateLimitResult
+        The outcome of the check, as returned by the rate limiter.
+
+    Returns
+    -------
+    dict[str, str]
+        `X-RateLimit-Limit`, `X-RateLimit-Remaining` and `X-RateLimit-Reset` (seconds until the quota is fully
+        restored), plus `Retry-After` (seconds) if the request was limited.
+    """
+    headers = {
+        "X-RateLimit-Limit": str(result.limit),
+        "X-RateLimit-Remaining": str(result.remaining),
+        "X-RateLimit-Reset": str(math.ceil(result.reset_after)),
+    }
+    if result.limited:
+        headers["Retry-After"] = str(max(1, math.ceil(result.retry_after)))
+
+    return headers
+
+
+class RateLimitHeadersMiddleware:
+    """Middleware to add the rate limit headers to responses of rate limited endpoints.
+
+    Parameters
+    ----------
+    app: ASGIApp
+        The ASGI application to wrap.
+
+    Note
+    ----
+        - The headers are taken from the `RateLimitResult` that `rate_limiter_dependency` stores in
+          `request.state.rate_limit`, so they cost no extra Redis call. Responses of endpoints without the
+          dependency are left untouched.
+        - This is a plain ASGI middleware rather than a `BaseHTTPMiddleware`, so responses are not buffered
+          and no extra task is spawned per request.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                result = scope.get("state", {}).get("rate_limit")
+                if result is not None:
+                    headers = MutableHeaders(scope=message)
+                    for name, value in rate_limit_headers(result).items():
+                        headers[name] = value
+
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
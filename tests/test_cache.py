@@ -0,0 +1,779 @@
+"""Unit tests for the cache utilities."""
+
+import asyncio
+import json
+import time
+from unittest.mock import ANY, AsyncMock, MagicMock, Mock, call, patch
+
+import pytest
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from pydantic import SecretStr
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.app.api.dependencies import verify_metrics_token
+from src.app.core.exceptions.cache_exceptions import CacheKeyTemplateError
+from src.app.core.exceptions.http_exceptions import NotFoundException, UnauthorizedException
+from src.app.core.utils import cache as cache_module
+from src.app.core.utils.cache import CacheCodec, LocalCache, cache
+from src.app.schemas.project import ProjectCreate
+
+
+def make_request(method: str = "GET") -> Mock:
+    request = Mock()
+    request.method = method
+    return request
+
+
+def make_pipeline(results: list | None = None) -> MagicMock:
+    pipe = MagicMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=None)
+    pipe.execute = AsyncMock(return_value=results or [])
+    return pipe
+
+
+@pytest.fixture
+def redis_client(mock_redis):
+    """Mock Redis client with pipelines, UNLINK and PUBLISH."""
+    mock_redis.pipeline = Mock(return_value=make_pipeline())
+    mock_redis.unlink = AsyncMock(return_value=1)
+    mock_redis.publish = AsyncMock(return_value=1)
+    return mock_redis
+
+
+class TestLocalCache:
+    """Test the in-process LRU tier."""
+
+    def test_get_returns_stored_value(self):
+        """Test a stored value is returned before it expires."""
+        local = LocalCache(max_bytes=1024)
+        local.set("key", b"value", ttl=60)
+
+        assert local.get("key") == b"value"
+        assert local.current_bytes == len("key") + len(b"value")
+
+    def test_expired_entry_is_dropped(self):
+        """Test entries are not returned after their TTL."""
+        local = LocalCache(max_bytes=1024)
+        with patch("src.app.core.utils.cache.time.monotonic", return_value=100.0):
+            local.set("key", b"value", ttl=10)
+
+        with patch("src.app.core.utils.cache.time.monotonic", return_value=111.0):
+            assert local.get("key") is None
+
+        assert local.current_bytes == 0
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test the byte budget evicts the least recently used entries first."""
+        local = LocalCache(max_bytes=25, max_entry_bytes=25)
+        local.set("a", b"x" * 9, ttl=60)
+        local.set("b", b"x" * 9, ttl=60)
+        local.get("a")
+        local.set("c", b"x" * 9, ttl=60)
+
+        assert "a" in local
+        assert "b" not in local
+        assert "c" in local
+        assert local.current_bytes <= local.max_bytes
+
+    def test_oversized_entry_is_not_stored(self):
+        """Test entries above the per-entry limit are skipped."""
+        local = LocalCache(max_bytes=100)
+        local.set("key", b"x" * 50, ttl=60)
+
+        assert local.get("key") is None
+
+    def test_delete_pattern(self):
+        """Test glob-style pattern deletion."""
+        local = LocalCache(max_bytes=1024)
+        local.set("alice_posts:page_1:alice", b"1", ttl=60)
+        local.set("alice_posts:page_2:alice", b"2", ttl=60)
+        local.set("bob_posts:page_1:bob", b"3", ttl=60)
+
+        local.delete_pattern("alice_posts:*")
+
+        assert len(local) == 1
+        assert "bob_posts:page_1:bob" in local
+
+
+class TestCacheDecorator:
+    """Test the cache decorator with both tiers."""
+
+    @pytest.mark.asyncio
+    async def test_local_hit_skips_redis(self, redis_client):
+        """Test a hot key is served from the local tier after the first call."""
+        endpoint = AsyncMock(return_value={"id": 1})
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id", local_expiration=10)(endpoint)
+        pipe = make_pipeline([None, -2])
+        redis_client.pipeline = Mock(return_value=pipe)
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "local_cache", LocalCache(max_bytes=1024)),
+            patch.object(cache_module, "cache_stats", {}),
+        ):
+            assert await cached(make_request(), username="alice", id=1) == {"id": 1}
+            assert await cached(make_request(), username="alice", id=1) == {"id": 1}
+
+            endpoint.assert_awaited_once()
+            pipe.get.assert_called_once_with("alice_post_cache:1")
+            redis_client.get.assert_not_awaited()
+            stats = cache_module.get_cache_stats()["{username}_post_cache"]
+            assert {name: stats[name] for name in cache_module._counters} == {
+                "local_hits": 1,
+                "hits": 0,
+                "misses": 1,
+                "coalesced": 0,
+                "refreshes": 0,
+            }
+            assert stats["hit_ratio"] == 0.5
+            assert stats["redis_seconds"]["count"] == 2
+            assert stats["payload_bytes"]["count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_redis_hit_populates_local_tier(self, redis_client):
+        """Test a Redis hit is copied into the local tier, reading its remaining TTL in the same round trip."""
+        endpoint = AsyncMock()
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id", local_expiration=10)(endpoint)
+        local = LocalCache(max_bytes=1024)
+        pipe = make_pipeline([json.dumps({"id": 1}).encode(), 60_000])
+        redis_client.pipeline = Mock(return_value=pipe)
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "local_cache", local),
+            patch.object(cache_module, "cache_stats", {}),
+        ):
+            assert await cached(make_request(), username="alice", id=1) == {"id": 1}
+
+        endpoint.assert_not_awaited()
+        assert "alice_post_cache:1" in local
+        pipe.pttl.assert_called_once_with("alice_post_cache:1")
+        redis_client.get.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_local_copy_does_not_outlive_redis_key(self, redis_client):
+        """Test a Redis hit is kept locally no longer than the remaining TTL of the key."""
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id", local_expiration=10)(AsyncMock())
+        local = LocalCache(max_bytes=1024)
+        redis_client.pipeline = Mock(return_value=make_pipeline([json.dumps({"id": 1}).encode(), 2_000]))
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "local_cache", local),
+            patch.object(cache_module, "cache_stats", {}),
+            patch("src.app.core.utils.cache.time.monotonic", return_value=100.0),
+        ):
+            await cached(make_request(), username="alice", id=1)
+
+        with patch("src.app.core.utils.cache.time.monotonic", return_value=101.0):
+            assert local.get("alice_post_cache:1") is not None
+        with patch("src.app.core.utils.cache.time.monotonic", return_value=103.0):
+            assert local.get("alice_post_cache:1") is None
+
+    @pytest.mark.asyncio
+    async def test_invalidation_clears_local_tier(self, redis_client):
+        """Test non-GET requests evict the key from the local tier."""
+        endpoint = AsyncMock(return_value={"message": "Post deleted"})
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id")(endpoint)
+        local = LocalCache(max_bytes=1024)
+        local.set("alice_post_cache:1", b"{}", ttl=60)
+
+        pipe = make_pipeline([1])
+        redis_client.pipeline = Mock(return_value=pipe)
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "local_cache", local):
+            await cached(make_request("DELETE"), username="alice", id=1)
+
+        assert "alice_post_cache:1" not in local
+        pipe.unlink.assert_called_once_with("alice_post_cache:1")
+
+        channel, message = redis_client.publish.await_args.args
+        assert channel == cache_module.invalidation_channel
+        assert json.loads(message)["keys"] == ["alice_post_cache:1"]
+
+
+class TestInvalidationBroadcast:
+    """Test cross-worker invalidation of the local tier."""
+
+    @pytest.mark.asyncio
+    async def test_listener_applies_messages_from_other_workers(self):
+        """Test broadcast invalidations evict keys, while this worker's own messages are skipped."""
+        local = LocalCache(max_bytes=1024)
+        local.set("alice_post_cache:1", b"{}", ttl=60)
+        local.set("alice_posts:page_1:alice", b"{}", ttl=60)
+        local.set("bob_post_cache:1", b"{}", ttl=60)
+
+        messages = [
+            {"data": json.dumps({"origin": cache_module._instance_id, "keys": ["bob_post_cache:1"], "patterns": []})},
+            {"data": json.dumps({"origin": "other", "keys": ["alice_post_cache:1"], "patterns": ["alice_posts:*"]})},
+        ]
+
+        async def listen():
+            for message in messages:
+                yield message
+            raise asyncio.CancelledError
+
+        pubsub = Mock()
+        pubsub.subscribe = AsyncMock()
+        pubsub.aclose = AsyncMock()
+        pubsub.listen = listen
+        redis_client = Mock()
+        redis_client.pubsub = Mock(return_value=pubsub)
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "local_cache", local):
+            with pytest.raises(asyncio.CancelledError):
+                await cache_module.listen_for_invalidations()
+
+        assert len(local) == 1
+        assert "bob_post_cache:1" in local
+        pubsub.aclose.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_malformed_message_does_not_stop_listener(self):
+        """Test a message that can not be parsed clears the local tier and later messages are still applied."""
+        local = LocalCache(max_bytes=1024)
+        local.set("alice_post_cache:1", b"{}", ttl=60)
+
+        async def listen():
+            yield {"data": b"not json"}
+            local.set("bob_post_cache:1", b"{}", ttl=60)
+            yield {"data": json.dumps({"origin": "other", "keys": ["bob_post_cache:1"], "patterns": []})}
+            raise asyncio.CancelledError
+
+        pubsub = Mock()
+        pubsub.subscribe = AsyncMock()
+        pubsub.aclose = AsyncMock()
+        pubsub.listen = listen
+        redis_client = Mock()
+        redis_client.pubsub = Mock(return_value=pubsub)
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "local_cache", local):
+            with pytest.raises(asyncio.CancelledError):
+                await cache_module.listen_for_invalidations()
+
+        assert len(local) == 0
+        pubsub.subscribe.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_local_tier_is_cleared_once_subscribed_again(self):
+        """Test entries cached while the subscription was down are dropped after reconnecting."""
+        local = LocalCache(max_bytes=1024)
+
+        async def listen():
+            raise asyncio.CancelledError
+            yield
+
+        async def sleep(interval):
+            local.set("alice_post_cache:1", b"{}", ttl=60)
+
+        pubsub = Mock()
+        pubsub.subscribe = AsyncMock(side_effect=[RedisConnectionError("down"), None])
+        pubsub.aclose = AsyncMock()
+        pubsub.listen = listen
+        redis_client = Mock()
+        redis_client.pubsub = Mock(return_value=pubsub)
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "local_cache", local),
+            patch("src.app.core.utils.cache.asyncio.sleep", side_effect=sleep),
+        ):
+            with pytest.raises(asyncio.CancelledError):
+                await cache_module.listen_for_invalidations()
+
+        assert len(local) == 0
+        assert pubsub.subscribe.await_count == 2
+
+
+class TestTagInvalidation:
+    """Test tag-based invalidation."""
+
+    @pytest.mark.asyncio
+    async def test_get_records_key_under_tags(self, redis_client):
+        """Test GET responses are added to the set of each formatted tag."""
+        endpoint = AsyncMock(return_value={"data": []})
+        cached = cache(
+            key_prefix="{username}_posts:page_{page}",
+            resource_id_name="username",
+            expiration=60,
+            tags=["{username}_posts"],
+        )(endpoint)
+        pipe = make_pipeline()
+        redis_client.pipeline = Mock(return_value=pipe)
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            await cached(make_request(), username="alice", page=1)
+
+        redis_client.pipeline.assert_called_once_with(transaction=False)
+        pipe.set.assert_called_once_with("alice_posts:page_1:alice", ANY, ex=60)
+        pipe.sadd.assert_called_once_with("cache_tag:alice_posts", "alice_posts:page_1:alice")
+        assert pipe.expire.call_args_list == [
+            call("cache_tag:alice_posts", 60, nx=True),
+            call("cache_tag:alice_posts", 60, gt=True),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_short_lived_write_does_not_shorten_tag_set(self):
+        """Test a tag set outlives every key recorded under it, whatever the order they are written in."""
+        fakeredis = pytest.importorskip("fakeredis")
+        client = fakeredis.FakeAsyncRedis()
+
+        with patch.object(cache_module, "client", client):
+            await cache_module._store("alice_posts:alice", b"{}", 3600, ["alice_posts"])
+            await cache_module._store("alice_posts:missing", b"{}", 5, ["alice_posts"])
+
+            assert await client.ttl("cache_tag:alice_posts") == 3600
+
+    @pytest.mark.asyncio
+    async def test_invalidate_tags_unlinks_members(self, redis_client):
+        """Test invalidating a tag removes its members and the tag set in two round trips."""
+        pipe = make_pipeline([{b"alice_posts:page_1:alice", b"alice_posts:page_2:alice"}, 1])
+        redis_client.pipeline = Mock(return_value=pipe)
+        redis_client.unlink = AsyncMock(return_value=2)
+
+        with patch.object(cache_module, "client", redis_client):
+            keys = await cache_module.invalidate_tags("alice_posts")
+
+        assert keys == ["alice_posts:page_1:alice", "alice_posts:page_2:alice"]
+        pipe.smembers.assert_called_once_with("cache_tag:alice_posts")
+        pipe.unlink.assert_called_once_with("cache_tag:alice_posts")
+        redis_client.unlink.assert_awaited_once_with(*keys)
+
+    @pytest.mark.asyncio
+    async def test_non_get_invalidates_tags_without_scan(self, redis_client):
+        """Test a PATCH unlinks its key and the tagged keys in two round trips without scanning the keyspace."""
+        endpoint = AsyncMock(return_value={"message": "Post updated"})
+        cached = cache(
+            "{username}_post_cache",
+            resource_id_name="id",
+            to_invalidate_extra={"{username}_post_count": "{username}"},
+            tags=["{username}_posts"],
+        )(endpoint)
+        pipe = make_pipeline([2, {b"alice_posts:page_1:alice"}, 1])
+        redis_client.pipeline = Mock(return_value=pipe)
+        redis_client.scan = AsyncMock()
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "local_cache", LocalCache(max_bytes=1024)),
+        ):
+            await cached(make_request("PATCH"), username="alice", id=1)
+
+        redis_client.scan.assert_not_awaited()
+        pipe.unlink.assert_any_call("alice_post_cache:1", "alice_post_count:alice")
+        assert redis_client.unlink.await_args_list == [call("alice_posts:page_1:alice")]
+        _, message = redis_client.publish.await_args.args
+        assert json.loads(message)["keys"] == [
+            "alice_post_cache:1",
+            "alice_post_count:alice",
+            "alice_posts:page_1:alice",
+        ]
+
+
+class TestSingleFlight:
+    """Test request coalescing on cache misses."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_run_endpoint_once(self, redis_client):
+        """Test concurrent GET misses on the same key share one endpoint call."""
+        release = asyncio.Event()
+
+        async def endpoint(request, username, id):
+            await release.wait()
+            return {"id": id}
+
+        tracked = AsyncMock(side_effect=endpoint)
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id")(tracked)
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            calls = [asyncio.create_task(cached(make_request(), username="alice", id=1)) for _ in range(5)]
+            await asyncio.sleep(0)
+            release.set()
+            results = await asyncio.gather(*calls)
+
+            assert results == [{"id": 1}] * 5
+            tracked.assert_awaited_once()
+            stats = cache_module.get_cache_stats()["{username}_post_cache"]
+            assert stats["misses"] == 1
+            assert stats["coalesced"] == 4
+
+        assert cache_module._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_followers_receive_leader_exception(self, redis_client):
+        """Test an exception raised by the leader is raised in every coalesced caller."""
+        release = asyncio.Event()
+
+        async def endpoint(request, username, id):
+            await release.wait()
+            raise ValueError("boom")
+
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id")(endpoint)
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            calls = [asyncio.create_task(cached(make_request(), username="alice", id=1)) for _ in range(3)]
+            await asyncio.sleep(0)
+            release.set()
+            results = await asyncio.gather(*calls, return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_follower_takes_over_from_cancelled_leader(self, redis_client):
+        """Test a cancelled leader, e.g. on client disconnect, does not cancel the requests coalesced onto it."""
+        release = asyncio.Event()
+
+        async def endpoint(request, username, id):
+            await release.wait()
+            return {"id": id}
+
+        tracked = AsyncMock(side_effect=endpoint)
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id")(tracked)
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            leader = asyncio.create_task(cached(make_request(), username="alice", id=1))
+            await asyncio.sleep(0)
+            followers = [asyncio.create_task(cached(make_request(), username="alice", id=1)) for _ in range(3)]
+            await asyncio.sleep(0)
+
+            leader.cancel()
+            for _ in range(3):
+                await asyncio.sleep(0)
+            release.set()
+
+            assert await asyncio.gather(*followers) == [{"id": 1}] * 3
+            assert leader.cancelled()
+            assert tracked.await_count == 2
+
+        assert cache_module._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_distributed_lock_waits_for_other_process(self, redis_client):
+        """Test a process that loses the Redis lock serves the value written by the lock holder."""
+        endpoint = AsyncMock()
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id", lock_timeout=1)(endpoint)
+        redis_client.get = AsyncMock(side_effect=[None, None, json.dumps({"id": 1}).encode()])
+        redis_client.set = AsyncMock(return_value=None)
+        redis_client.exists = AsyncMock(return_value=1)
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "cache_stats", {}),
+            patch("src.app.core.utils.cache.asyncio.sleep", new_callable=AsyncMock),
+        ):
+            assert await cached(make_request(), username="alice", id=1) == {"id": 1}
+
+        endpoint.assert_not_awaited()
+        redis_client.set.assert_awaited_once()
+        assert redis_client.set.await_args.kwargs == {"nx": True, "px": 1000}
+
+    @pytest.mark.asyncio
+    async def test_stops_waiting_once_lock_is_released_without_value(self, redis_client):
+        """Test a process that loses the Redis lock runs the endpoint once the holder releases it empty-handed."""
+        endpoint = AsyncMock(return_value={"id": 1})
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id", lock_timeout=5)(endpoint)
+        redis_client.set = AsyncMock(return_value=None)
+        redis_client.exists = AsyncMock(side_effect=[1, 0])
+        sleep = AsyncMock()
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "cache_stats", {}),
+            patch("src.app.core.utils.cache.asyncio.sleep", sleep),
+        ):
+            assert await cached(make_request(), username="alice", id=1) == {"id": 1}
+
+        endpoint.assert_awaited_once()
+        assert sleep.await_count == 2
+
+
+class TestStaleWhileRevalidate:
+    """Test serving stale entries while they are refreshed in the background."""
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_is_served_and_refreshed(self, redis_client, mock_db):
+        """Test an expired entry within stale_ttl is returned immediately and recomputed with a new session."""
+        sessions = []
+
+        async def endpoint(request, username, id, db):
+            sessions.append(db)
+            return {"id": id, "fresh": True}
+
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id", expiration=60, stale_ttl=30)(endpoint)
+        stale_entry = {"version": 1, "value": {"id": 1, "fresh": False}, "expires_at": 0, "delta": 0.01}
+        redis_client.get = AsyncMock(return_value=json.dumps(stale_entry).encode())
+        refresh_db = Mock()
+        session_factory = MagicMock()
+        session_factory.return_value.__aenter__ = AsyncMock(return_value=refresh_db)
+        session_factory.return_value.__aexit__ = AsyncMock(return_value=None)
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "cache_stats", {}),
+            patch.object(cache_module, "local_session", session_factory),
+        ):
+            result = await cached(make_request(), username="alice", id=1, db=mock_db)
+            await asyncio.gather(*cache_module._background_tasks)
+
+            assert result == {"id": 1, "fresh": False}
+            assert sessions == [refresh_db]
+            assert cache_module.get_cache_stats()["{username}_post_cache"]["refreshes"] == 1
+
+        pipe = redis_client.pipeline.return_value
+        key, value = pipe.set.call_args.args
+        assert key == "alice_post_cache:1"
+        assert cache_module.codec.decode(value)["value"] == {"id": 1, "fresh": True}
+        assert pipe.set.call_args.kwargs == {"ex": 90}
+
+    @pytest.mark.asyncio
+    async def test_entry_without_envelope_is_a_miss(self, redis_client):
+        """Test a plain payload, e.g. written before stale_ttl was set, is recomputed instead of failing."""
+        endpoint = AsyncMock(return_value={"id": 1, "fresh": True})
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id", expiration=60, stale_ttl=30)(endpoint)
+        redis_client.get = AsyncMock(return_value=json.dumps({"id": 1, "fresh": False}).encode())
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            result = await cached(make_request(), username="alice", id=1)
+
+        assert result == {"id": 1, "fresh": True}
+        endpoint.assert_awaited_once()
+        key, value = redis_client.pipeline.return_value.set.call_args.args
+        assert key == "alice_post_cache:1"
+        assert cache_module.codec.decode(value)["version"] == 1
+
+    @pytest.mark.asyncio
+    async def test_refresh_is_counted_once_per_task(self, redis_client):
+        """Test stale hits while a refresh of the key is already running do not count as new refreshes."""
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id", expiration=60, stale_ttl=30)(
+            AsyncMock()
+        )
+        stale_entry = {"version": 1, "value": {"id": 1}, "expires_at": 0, "delta": 0.01}
+        redis_client.get = AsyncMock(return_value=json.dumps(stale_entry).encode())
+
+        with (
+            patch.object(cache_module, "client", redis_client),
+            patch.object(cache_module, "cache_stats", {}),
+            patch.object(cache_module, "_inflight", {"alice_post_cache:1": asyncio.Future()}),
+        ):
+            assert await cached(make_request(), username="alice", id=1) == {"id": 1}
+            assert cache_module.get_cache_stats()["{username}_post_cache"]["refreshes"] == 0
+
+    def test_fresh_entry_does_not_need_refresh(self):
+        """Test entries far from their expiry are not refreshed."""
+        entry = {"value": {}, "expires_at": time.time() + 3600, "delta": 0.01}
+
+        assert not cache_module._needs_refresh(entry, beta=None)
+        assert not cache_module._needs_refresh(entry, beta=1.0)
+
+    def test_early_refresh_close_to_expiry(self):
+        """Test XFetch refreshes an entry whose remaining lifetime is short compared to its compute time."""
+        entry = {"value": {}, "expires_at": time.time() + 1, "delta": 10.0}
+
+        with patch("src.app.core.utils.cache.random.random", return_value=0.5):
+            assert cache_module._needs_refresh(entry, beta=1.0)
+            assert not cache_module._needs_refresh(entry, beta=None)
+
+
+class TestCacheCodec:
+    """Test cache value serialization."""
+
+    @pytest.mark.parametrize("serializer", ["json", "orjson", "msgpack"])
+    @pytest.mark.parametrize("compression", [None, "zlib", "zstd", "lz4"])
+    def test_round_trip(self, serializer, compression, sample_user_read):
+        """Test values, including Pydantic models, survive encoding with every codec."""
+        pytest.importorskip({"json": "json", "orjson": "orjson", "msgpack": "msgpack"}[serializer])
+        if compression is not None:
+            pytest.importorskip({"zlib": "zlib", "zstd": "zstandard", "lz4": "lz4"}[compression])
+
+        codec = CacheCodec(serializer=serializer, compression=compression, compression_threshold=16)
+        value = {"data": [sample_user_read] * 3, "total_count": 3}
+
+        assert codec.decode(codec.encode(value)) == jsonable_encoder(value)
+
+    def test_msgpack_int_keys(self):
+        """Test dicts keyed by integers, which msgpack keeps as such, can be read back."""
+        pytest.importorskip("msgpack")
+        codec = CacheCodec(serializer="msgpack")
+
+        assert codec.decode(codec.encode({1: "a", 2: "b"})) == {1: "a", 2: "b"}
+
+    @pytest.mark.asyncio
+    async def test_undecodable_entry_is_dropped_and_recomputed(self, redis_client):
+        """Test an entry that can not be decoded is deleted and read as a miss instead of failing the request."""
+        endpoint = AsyncMock(return_value={"id": 1})
+        cached = cache(key_prefix="{username}_post_cache", resource_id_name="id")(endpoint)
+        redis_client.get = AsyncMock(return_value=b"jz-not-zlib")
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            assert await cached(make_request(), username="alice", id=1) == {"id": 1}
+            assert cache_module.get_cache_stats()["{username}_post_cache"]["hits"] == 0
+
+        redis_client.delete.assert_awaited_once_with("alice_post_cache:1")
+        endpoint.assert_awaited_once()
+
+    def test_small_payloads_are_not_compressed(self):
+        """Test payloads below the threshold are stored uncompressed."""
+        codec = CacheCodec(compression="zlib", compression_threshold=1024)
+
+        assert codec.encode({"id": 1})[:2] == b"j-"
+
+    def test_legacy_entries_are_decoded(self):
+        """Test plain JSON written before the codec header existed is still readable."""
+        assert CacheCodec().decode(b'{"id": 1}') == {"id": 1}
+
+    def test_unknown_serializer(self):
+        """Test an unknown serializer is rejected at configuration time."""
+        with pytest.raises(ValueError):
+            CacheCodec(serializer="pickle")
+
+    @pytest.mark.asyncio
+    async def test_miss_returns_endpoint_result(self, redis_client, sample_user_read):
+        """Test a miss returns the endpoint's own value and stores it with a single encode."""
+        cached = cache(key_prefix="{username}_user", resource_id_name="username")(
+            AsyncMock(return_value=sample_user_read)
+        )
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            result = await cached(make_request(), username="alice")
+
+        assert result is sample_user_read
+        _, stored = redis_client.pipeline.return_value.set.call_args.args
+        assert cache_module.codec.decode(stored) == jsonable_encoder(sample_user_read)
+
+
+class TestNegativeCaching:
+    """Test caching of not-found outcomes."""
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_cached_and_replayed(self, redis_client):
+        """Test a NotFoundException is stored with its own TTL and raised again on the next request."""
+        endpoint = AsyncMock(side_effect=NotFoundException("Project not found"))
+        cached = cache("project_cache", resource_id_name="name", not_found_expiration=30)(endpoint)
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            with pytest.raises(NotFoundException, match="Project not found"):
+                await cached(make_request(), name="missing")
+
+            pipe = redis_client.pipeline.return_value
+            key, stored = pipe.set.call_args.args
+            assert key == "project_cache:missing"
+            assert pipe.set.call_args.kwargs == {"ex": 30}
+
+            redis_client.get = AsyncMock(return_value=stored)
+            with pytest.raises(NotFoundException, match="Project not found") as exc_info:
+                await cached(make_request(), name="missing")
+
+        assert exc_info.value.status_code == 404
+        endpoint.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_not_found_is_not_cached_by_default(self, redis_client):
+        """Test not-found outcomes are only cached when not_found_expiration is set."""
+        cached = cache("project_cache", resource_id_name="name")(AsyncMock(side_effect=NotFoundException()))
+
+        with patch.object(cache_module, "client", redis_client), patch.object(cache_module, "cache_stats", {}):
+            with pytest.raises(NotFoundException):
+                await cached(make_request(), name="missing")
+
+        redis_client.pipeline.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_create_invalidates_key_from_body_attribute(self, redis_client):
+        """Test a dotted resource_id_name lets a create endpoint invalidate the read key."""
+        cached = cache("project_cache", resource_id_name="project.name")(AsyncMock(return_value={"id": 1}))
+        pipe = make_pipeline([1])
+        redis_client.pipeline = Mock(return_value=pipe)
+
+        with patch.object(cache_module, "client", redis_client):
+            await cached(make_request("POST"), project=ProjectCreate(name="Tower A", description="Inspection"))
+
+        pipe.unlink.assert_called_once_with("project_cache:Tower A")
+
+
+class TestKeyTemplates:
+    """Test cache key templates compiled at decoration time."""
+
+    def test_format(self):
+        """Test placeholders, dotted paths and format specs are resolved."""
+        template = cache_module._KeyTemplate("{project.name}_levels:page_{page:03d}")
+        project = ProjectCreate(name="Tower A", description="Inspection")
+
+        assert template.format({"project": project, "page": 2}) == "Tower A_levels:page_002"
+
+    def test_literal_template_is_returned_as_is(self):
+        """Test templates without placeholders skip formatting."""
+        assert cache_module._KeyTemplate("project_cache").format({}) == "project_cache"
+
+    def test_unknown_placeholder_fails_at_decoration(self):
+        """Test a typo in a key template is reported when the decorator is applied."""
+
+        async def read_post(request, username: str, id: int):
+            return {}
+
+        with pytest.raises(CacheKeyTemplateError, match="usrname"):
+            cache(key_prefix="{usrname}_post_cache", resource_id_name="id")(read_post)
+
+        with pytest.raises(CacheKeyTemplateError, match="post_id"):
+            cache(key_prefix="{username}_post_cache", resource_id_name="post_id")(read_post)
+
+        with pytest.raises(CacheKeyTemplateError, match="user"):
+            cache(key_prefix="{username}_post_cache", resource_id_name="id", tags=["{user}_posts"])(read_post)
+
+
+class TestCacheMetrics:
+    """Test the cache observability surface."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test observations land in the first bucket whose bound they do not exceed."""
+        histogram = cache_module.Histogram((1.0, 10.0))
+        for value in (0.5, 1.0, 5.0, 50.0):
+            histogram.observe(value)
+
+        assert histogram.as_dict() == {"buckets": {"1": 2, "10": 3, "+Inf": 4}, "sum": 56.5, "count": 4}
+
+    def test_bucket_labels_are_exact(self):
+        """Test large and fractional bounds are labelled without rounding."""
+        histogram = cache_module.Histogram((0.0005, 1048576.0, 1234567.5))
+
+        assert list(histogram.as_dict()["buckets"]) == ["0.0005", "1048576", "1234567.5", "+Inf"]
+
+    def test_hit_ratio_is_none_before_first_call(self):
+        """Test endpoints that were never called have no hit ratio."""
+        assert cache_module.CacheStats().hit_ratio is None
+
+    def test_render_prometheus_exposition(self):
+        """Test counters and histograms are rendered in the Prometheus text format."""
+        stats = cache_module.CacheStats(hits=3, misses=1, refreshes=2)
+        stats.payload_bytes.observe(100)
+
+        with (
+            patch.object(cache_module, "cache_stats", {'{username}_"post"': stats}),
+            patch("src.app.core.utils.cache.os.getpid", return_value=42),
+        ):
+            metrics = cache_module.render_cache_metrics()
+
+        assert 'cache_requests_total{key_prefix="{username}_\\"post\\"",pid="42",outcome="hits"} 3' in metrics
+        assert 'cache_refreshes_total{key_prefix="{username}_\\"post\\"",pid="42"} 2' in metrics
+        assert 'outcome="refreshes"' not in metrics
+        assert "# TYPE cache_payload_bytes histogram" in metrics
+        assert 'cache_payload_bytes_bucket{key_prefix="{username}_\\"post\\"",pid="42",le="256"} 1' in metrics
+        assert 'cache_redis_seconds_count{key_prefix="{username}_\\"post\\"",pid="42"} 0' in metrics
+        assert metrics.endswith("\n")
+
+    @pytest.mark.asyncio
+    async def test_metrics_require_scrape_token(self):
+        """Test the metrics endpoint accepts the static scrape token, and is not found without one configured."""
+
+        def request(authorization: str) -> Request:
+            return Request({"type": "http", "headers": [(b"authorization", authorization.encode())]})
+
+        with patch("src.app.api.dependencies.settings.CACHE_METRICS_TOKEN", None):
+            with pytest.raises(NotFoundException):
+                await verify_metrics_token(request("Bearer scrape"))
+
+        with patch("src.app.api.dependencies.settings.CACHE_METRICS_TOKEN", SecretStr("scrape")):
+            await verify_metrics_token(request("Bearer scrape"))
+            with pytest.raises(UnauthorizedException):
+                await verify_metrics_token(request("Bearer other"))
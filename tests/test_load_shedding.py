@@ -0,0 +1,97 @@
+"""Unit tests for the load shedding middleware."""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.app.middleware.load_shedding_middleware import (
+    AdaptiveConcurrencyLimit,
+    LoadSheddingMiddleware,
+    Priority,
+)
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.add_middleware(LoadSheddingMiddleware, initial_limit=10, min_limit=2, max_limit=20)
+
+    @app.get("/api/v1/projects")
+    async def read_projects() -> list:
+        return []
+
+    @app.post("/api/v1/login")
+    async def login() -> dict[str, str]:
+        return {"access_token": "token"}
+
+    return app
+
+
+def get_middleware(client: TestClient) -> LoadSheddingMiddleware:
+    stack = client.app.middleware_stack
+    while not isinstance(stack, LoadSheddingMiddleware):
+        stack = stack.app
+    return stack
+
+
+class TestAdaptiveConcurrencyLimit:
+    """Test the AIMD concurrency limit."""
+
+    def test_fast_requests_grow_the_limit(self):
+        """Test the limit grows by about one after a limit's worth of fast requests."""
+        concurrency = AdaptiveConcurrencyLimit(initial_limit=10, min_limit=2, max_limit=20, latency_target=0.5)
+        for _ in range(10):
+            assert concurrency.try_acquire(Priority.CRITICAL)
+            concurrency.release(latency=0.01)
+
+        assert 10.9 < concurrency.limit < 11.0
+        assert concurrency.in_flight == 0
+
+    def test_slow_requests_shrink_the_limit_once_per_target(self):
+        """Test a burst of slow requests backs off once, not once per request."""
+        concurrency = AdaptiveConcurrencyLimit(initial_limit=10, min_limit=2, max_limit=20, latency_target=0.5)
+        for _ in range(3):
+            concurrency.try_acquire(Priority.CRITICAL)
+        for _ in range(3):
+            concurrency.release(latency=2.0)
+
+        assert concurrency.limit == 9.0
+
+    def test_lower_priorities_are_shed_first(self):
+        """Test low priority requests only get their share of the limit."""
+        concurrency = AdaptiveConcurrencyLimit(initial_limit=10, min_limit=2, max_limit=20, latency_target=0.5)
+
+        admitted = [concurrency.try_acquire(Priority.LOW) for _ in range(6)]
+
+        assert admitted == [True] * 5 + [False]
+        assert concurrency.try_acquire(Priority.CRITICAL)
+
+
+class TestLoadSheddingMiddleware:
+    """Test requests are shed with a 503."""
+
+    @pytest.mark.parametrize(
+        "method, path, priority",
+        [
+            ("POST", "/api/v1/login", Priority.CRITICAL),
+            ("PATCH", "/api/v1/defect/crack", Priority.HIGH),
+            ("GET", "/api/v1/buildings", Priority.LOW),
+            ("GET", "/api/v1/alice/posts", Priority.LOW),
+            ("GET", "/api/v1/building/3", Priority.NORMAL),
+        ],
+    )
+    def test_priority_rules(self, method, path, priority):
+        """Test routes are classified by the default priority rules."""
+        assert LoadSheddingMiddleware(FastAPI()).priority_of(method, path) == priority
+
+    def test_overloaded_list_endpoint_is_shed(self, app):
+        """Test list endpoints get a 503 with Retry-After while login still goes through."""
+        client = TestClient(app)
+        assert client.get("/api/v1/projects").status_code == 200
+
+        get_middleware(client).concurrency.in_flight = 5
+        response = client.get("/api/v1/projects")
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert client.post("/api/v1/login").status_code == 200
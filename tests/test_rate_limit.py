@@ -0,0 +1,328 @@
+"""Unit tests for the Redis rate limiter."""
+
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from fastapi import Depends, FastAPI, Request
+from fastapi.testclient import TestClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.app.api.dependencies import get_route_path, rate_limiter_dependency
+from src.app.core.exceptions.http_exceptions import RateLimitException
+from src.app.core.utils.rate_limit import (
+    LocalRateLimiter,
+    RateLimiter,
+    RateLimitPolicies,
+    RateLimitResult,
+    rate_limit_policies,
+    rate_limiter,
+)
+from src.app.middleware.rate_limit_headers_middleware import RateLimitHeadersMiddleware
+
+
+@pytest.fixture
+def script():
+    """Install a mocked Lua script for the configured algorithm."""
+    script = AsyncMock(return_value=[1, 4, 30000, 0])
+    with (
+        patch.object(rate_limiter, "client", Mock()),
+        patch.object(rate_limiter, "algorithm", "sliding_window"),
+        patch.object(rate_limiter, "scripts", {"sliding_window": script}),
+    ):
+        yield script
+
+
+def make_request(path: str = "/api/v1/tasks"):
+    request = Mock()
+    request.url.path = path
+    request.scope = {}
+    request.client.host = "127.0.0.1"
+    request.app.state = Mock(spec=[])
+    request.state = Mock(spec=[])
+    return request
+
+
+class TestRateLimiter:
+    """Test the rate limiter client."""
+
+    def test_initialize_rejects_unknown_algorithm(self):
+        """Test an unknown algorithm is refused before connecting."""
+        with pytest.raises(ValueError, match="leaky_bucket"):
+            RateLimiter.initialize("redis://localhost:6379", algorithm="leaky_bucket")
+
+    @pytest.mark.asyncio
+    async def test_check_runs_one_script(self, script):
+        """Test a check is a single script call returning the remaining quota."""
+        result = await rate_limiter.check(user_id=1, path="/api/v1/tasks", limit=5, period=60)
+
+        assert result == RateLimitResult(limited=False, limit=5, remaining=4, reset_after=30.0, retry_after=0.0)
+        script.assert_awaited_once()
+        assert script.await_args.kwargs["keys"] == ["ratelimit:sliding_window:1:api_v1_tasks"]
+        assert script.await_args.kwargs["args"][:2] == [5, 60000]
+        assert script.await_args.kwargs["args"][3] == 1
+
+    @pytest.mark.asyncio
+    async def test_is_rate_limited(self, script, mock_db):
+        """Test the boolean helper reports a limited request."""
+        script.return_value = [0, 0, 30000, 1500]
+
+        assert await rate_limiter.is_rate_limited(db=mock_db, user_id=1, path="/tasks", limit=5, period=60)
+
+    @pytest.mark.asyncio
+    async def test_lease_admits_locally(self, script):
+        """Test a leased chunk of quota is spent without further Redis calls."""
+        script.return_value = [3, 7, 30000, 0]
+
+        with patch.object(rate_limiter, "lease_fraction", 0.3), patch.object(rate_limiter, "leases", {}):
+            results = [await rate_limiter.check(user_id=1, path="/tasks", limit=10, period=60) for _ in range(3)]
+
+            script.assert_awaited_once()
+            assert script.await_args.kwargs["args"][3] == 3
+            assert [result.remaining for result in results] == [9, 8, 7]
+            assert not any(result.limited for result in results)
+
+            await rate_limiter.check(user_id=1, path="/tasks", limit=10, period=60)
+            assert script.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_not_spent(self, script):
+        """Test reservations are dropped once the lease expires."""
+        script.return_value = [3, 7, 30000, 0]
+
+        with patch.object(rate_limiter, "lease_fraction", 0.3), patch.object(rate_limiter, "leases", {}):
+            await rate_limiter.check(user_id=1, path="/tasks", limit=10, period=60)
+            rate_limiter.leases["ratelimit:sliding_window:1:tasks"].expires_at = time.monotonic() - 1
+            await rate_limiter.check(user_id=1, path="/tasks", limit=10, period=60)
+
+            assert script.await_count == 2
+
+    def test_initialize_rejects_invalid_lease_fraction(self):
+        """Test lease fractions outside [0, 1] are refused."""
+        with pytest.raises(ValueError, match="lease fraction"):
+            RateLimiter.initialize("redis://localhost:6379", lease_fraction=1.5)
+
+    @pytest.mark.asyncio
+    async def test_uninitialized_client_limits_locally(self):
+        """Test checking before initialization falls back to the in-process limiter."""
+        with patch.object(rate_limiter, "client", None), patch.object(rate_limiter, "fallback", LocalRateLimiter()):
+            results = [await rate_limiter.check(user_id=1, path="/tasks", limit=2, period=60) for _ in range(3)]
+
+        assert [result.limited for result in results] == [False, False, True]
+
+    @pytest.mark.asyncio
+    async def test_redis_outage_falls_back_and_recovers(self, script):
+        """Test a Redis error degrades to local limiting, and Redis is used again once it answers."""
+        script.side_effect = RedisConnectionError("Connection refused")
+        fallback = LocalRateLimiter()
+
+        with patch.object(rate_limiter, "fallback", fallback), patch.object(rate_limiter, "unavailable_until", 0.0):
+            result = await rate_limiter.check(user_id=1, path="/tasks", limit=5, period=60)
+            assert result.remaining == 4
+            await rate_limiter.check(user_id=1, path="/tasks", limit=5, period=60)
+            script.assert_awaited_once()
+
+            script.side_effect = None
+            rate_limiter.unavailable_until = 0.0
+            result = await rate_limiter.check(user_id=1, path="/tasks", limit=5, period=60)
+
+            assert result.remaining == 4
+            assert script.await_count == 2
+            assert not fallback.counters
+
+    @pytest.mark.asyncio
+    async def test_unexpected_errors_propagate(self, script):
+        """Test errors other than Redis being unavailable are not hidden by the fallback."""
+        script.side_effect = ValueError("bad reply")
+
+        with pytest.raises(ValueError, match="bad reply"):
+            await rate_limiter.check(user_id=1, path="/tasks", limit=5, period=60)
+
+
+class TestLocalRateLimiter:
+    """Test the in-process fallback limiter."""
+
+    def test_limit_is_enforced_per_key(self):
+        """Test each key gets its own quota."""
+        limiter = LocalRateLimiter()
+
+        granted = [limiter.check("a", limit=3, period=60)[1] for _ in range(4)]
+        result, _ = limiter.check("b", limit=3, period=60)
+
+        assert granted == [1, 1, 1, 0]
+        assert not result.limited
+
+    def test_memory_is_bounded(self):
+        """Test the least recently used keys are forgotten beyond the maximum."""
+        limiter = LocalRateLimiter(max_keys=2)
+        for key in ("a", "b", "a", "c"):
+            limiter.check(key, limit=3, period=60)
+
+        assert list(limiter.counters) == ["a", "c"]
+
+
+class TestRateLimiterDependency:
+    """Test the rate limiter dependency."""
+
+    @pytest.mark.asyncio
+    async def test_anonymous_request_uses_default_limit(self, script, mock_db):
+        """Test anonymous requests are limited by client address with the default limit."""
+        request = make_request()
+
+        await rate_limiter_dependency(request, mock_db, user=None)
+
+        assert script.await_args.kwargs["keys"] == ["ratelimit:sliding_window:127.0.0.1:api_v1_tasks"]
+        assert request.state.rate_limit.remaining == 4
+
+    @pytest.mark.asyncio
+    async def test_limited_request_raises(self, script, mock_db):
+        """Test a limited request is rejected."""
+        script.return_value = [0, 0, 30000, 1500]
+
+        with patch.object(rate_limit_policies, "get", AsyncMock(return_value=(None, None))):
+            with pytest.raises(RateLimitException, match="Rate limit exceeded"):
+                await rate_limiter_dependency(make_request(), mock_db, user={"id": 1, "tier_id": 1})
+
+    @pytest.mark.asyncio
+    async def test_tier_policy_is_applied(self, script, mock_db):
+        """Test the tier's rate limit for the path replaces the default."""
+        with patch.object(rate_limit_policies, "get", AsyncMock(return_value=("pro", (100, 60)))) as mock_get:
+            await rate_limiter_dependency(make_request(), mock_db, user={"id": 1, "tier_id": 2})
+
+        mock_get.assert_awaited_once_with(mock_db, tier_id=2, path="api_v1_tasks")
+        assert script.await_args.kwargs["args"][:2] == [100, 60000]
+
+    @pytest.mark.asyncio
+    async def test_key_uses_route_template(self, script, mock_db):
+        """Test every concrete URL of a parameterised route shares one key and policy."""
+        request = make_request("/api/v1/building/42")
+        request.scope = {"route": Mock(path_format="/api/v1/building/{building_id}")}
+
+        with patch.object(rate_limit_policies, "get", AsyncMock(return_value=("pro", (100, 60)))) as mock_get:
+            await rate_limiter_dependency(request, mock_db, user={"id": 1, "tier_id": 2})
+
+        mock_get.assert_awaited_once_with(mock_db, tier_id=2, path="api_v1_building_{building_id}")
+        assert script.await_args.kwargs["keys"] == ["ratelimit:sliding_window:1:api_v1_building_{building_id}"]
+
+    def test_route_template_of_matched_route(self):
+        """Test the matched route template is used as the rate limit path."""
+        app = FastAPI()
+        paths = []
+
+        @app.get("/api/v1/building/{building_id}")
+        async def read_building(request: Request, building_id: int) -> None:
+            paths.append(get_route_path(request))
+
+        TestClient(app).get("/api/v1/building/42")
+
+        assert paths == ["/api/v1/building/{building_id}"]
+
+
+class TestRateLimitPolicies:
+    """Test the in-memory policy table."""
+
+    @pytest.fixture
+    def crud(self):
+        with (
+            patch("src.app.core.utils.rate_limit.crud_tiers") as mock_tiers,
+            patch("src.app.core.utils.rate_limit.crud_rate_limits") as mock_rate_limits,
+        ):
+            mock_tiers.get_multi = AsyncMock(return_value={"data": [{"id": 1, "name": "free"}]})
+            mock_rate_limits.get_multi = AsyncMock(
+                return_value={"data": [{"tier_id": 1, "path": "api_v1_tasks", "limit": 5, "period": 60}]}
+            )
+            yield mock_tiers, mock_rate_limits
+
+    @pytest.mark.asyncio
+    async def test_lookups_are_served_from_memory(self, crud, mock_db):
+        """Test the database is queried once for any number of lookups."""
+        mock_tiers, mock_rate_limits = crud
+        policies = RateLimitPolicies()
+
+        assert await policies.get(mock_db, tier_id=1, path="api_v1_tasks") == ("free", (5, 60))
+        assert await policies.get(mock_db, tier_id=1, path="api_v1_posts") == ("free", None)
+        assert await policies.get(mock_db, tier_id=2, path="api_v1_tasks") == (None, None)
+
+        mock_tiers.get_multi.assert_awaited_once()
+        mock_rate_limits.get_multi.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_reloads(self, crud, mock_db):
+        """Test a change made through the write endpoints is picked up on the next lookup."""
+        _, mock_rate_limits = crud
+        policies = RateLimitPolicies()
+        await policies.get(mock_db, tier_id=1, path="api_v1_tasks")
+
+        mock_rate_limits.get_multi.return_value = {
+            "data": [{"tier_id": 1, "path": "api_v1_tasks", "limit": 50, "period": 60}]
+        }
+        policies.invalidate()
+
+        assert await policies.get(mock_db, tier_id=1, path="api_v1_tasks") == ("free", (50, 60))
+
+    @pytest.mark.asyncio
+    async def test_stale_table_is_reloaded(self, crud, mock_db):
+        """Test the table is reloaded once it is older than its max age."""
+        mock_tiers, _ = crud
+        policies = RateLimitPolicies(max_age=0)
+        await policies.get(mock_db, tier_id=1, path="api_v1_tasks")
+        policies.loaded_at = time.monotonic() - 1
+
+        await policies.get(mock_db, tier_id=1, path="api_v1_tasks")
+
+        assert mock_tiers.get_multi.await_count == 2
+
+
+class TestRateLimitHeadersMiddleware:
+    """Test the rate limit response headers."""
+
+    @pytest.fixture
+    def app(self):
+        app = FastAPI()
+        app.add_middleware(RateLimitHeadersMiddleware)
+
+        async def limit(request: Request) -> None:
+            result = RateLimitResult(
+                limited=request.query_params.get("limited") == "1",
+                limit=10,
+                remaining=0 if request.query_params.get("limited") == "1" else 9,
+                reset_after=42.2,
+                retry_after=1.5,
+            )
+            request.state.rate_limit = result
+            if result.limited:
+                raise RateLimitException("Rate limit exceeded.")
+
+        @app.get("/limited", dependencies=[Depends(limit)])
+        async def limited() -> dict[str, str]:
+            return {"message": "ok"}
+
+        @app.get("/unlimited")
+        async def unlimited() -> dict[str, str]:
+            return {"message": "ok"}
+
+        return app
+
+    def test_admitted_response_carries_quota(self, app):
+        """Test admitted responses report the limit, remaining quota and reset time."""
+        response = TestClient(app).get("/limited")
+
+        assert response.status_code == 200
+        assert response.headers["X-RateLimit-Limit"] == "10"
+        assert response.headers["X-RateLimit-Remaining"] == "9"
+        assert response.headers["X-RateLimit-Reset"] == "43"
+        assert "Retry-After" not in response.headers
+
+    def test_rejected_response_carries_retry_after(self, app):
+        """Test rejected responses tell the client when to retry."""
+        response = TestClient(app).get("/limited", params={"limited": "1"})
+
+        assert response.status_code == 429
+        assert response.headers["X-RateLimit-Remaining"] == "0"
+        assert response.headers["Retry-After"] == "2"
+
+    def test_endpoints_without_limit_are_untouched(self, app):
+        """Test endpoints without the rate limiter dependency get no headers."""
+        response = TestClient(app).get("/unlimited")
+
+        assert "X-RateLimit-Limit" not in response.headers
@@ -0,0 +1,165 @@
+"""Correctness and throughput tests for the rate limiter scripts, run against fakeredis."""
+
+import asyncio
+import os
+import statistics
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src.app.core.utils.rate_limit import _scripts, rate_limiter
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+ALGORITHMS = list(_scripts)
+
+# Requests admitted above the limit within one period, as a fraction of the limit. The fixed window admits a full
+# second window right after the boundary, the sliding window counter is an approximation.
+BOUNDARY_OVERSHOOT = {"fixed_window": 1.0, "sliding_window": 0.1, "sliding_log": 0, "token_bucket": 0, "gcra": 0}
+
+MIN_CHECKS_PER_SECOND = float(os.environ.get("RATE_LIMIT_BENCHMARK_MIN_CPS", 500))
+MAX_P99_SECONDS = float(os.environ.get("RATE_LIMIT_BENCHMARK_MAX_P99", 0.02))
+
+
+class Clock:
+    """Controllable wall clock, read by fakeredis for TIME and key expiry."""
+
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    clock = Clock(1_700_000_000.0)
+    with patch("time.time", clock):
+        yield clock
+
+
+@pytest.fixture(params=ALGORITHMS)
+def limiter(request):
+    client = fakeredis.FakeAsyncRedis()
+    with (
+        patch.object(rate_limiter, "client", client),
+        patch.object(
+            rate_limiter, "scripts", {name: client.register_script(script) for name, script in _scripts.items()}
+        ),
+        patch.object(rate_limiter, "algorithm", request.param),
+        patch.object(rate_limiter, "lease_fraction", 0.0),
+        patch.object(rate_limiter, "leases", {}),
+        patch.object(rate_limiter, "pending_leases", {}),
+        patch.object(rate_limiter, "unavailable_until", 0.0),
+    ):
+        yield rate_limiter
+
+
+async def burst(limiter, count: int, limit: int = 10, period: int = 10, user_id: int = 1) -> int:
+    results = await asyncio.gather(
+        *(limiter.check(user_id=user_id, path="/api/v1/tasks", limit=limit, period=period) for _ in range(count))
+    )
+    return sum(not result.limited for result in results)
+
+
+class TestAccuracy:
+    """Test the number of admitted requests for each algorithm."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_burst_admits_exactly_the_limit(self, limiter, clock):
+        """Test concurrent checks admit exactly `limit` requests."""
+        assert await burst(limiter, 100) == 10
+
+    @pytest.mark.asyncio
+    async def test_users_do_not_share_quota(self, limiter, clock):
+        """Test quotas are counted per user."""
+        assert await burst(limiter, 15, user_id=1) == 10
+        assert await burst(limiter, 15, user_id=2) == 10
+
+    @pytest.mark.asyncio
+    async def test_window_boundary_overshoot_is_bounded(self, limiter, clock):
+        """Test a burst on both sides of a window boundary stays within the algorithm's bound."""
+        clock.advance(9.9)
+        admitted = await burst(limiter, 20)
+        clock.advance(0.2)
+        admitted += await burst(limiter, 20)
+
+        assert admitted <= 10 * (1 + BOUNDARY_OVERSHOOT[limiter.algorithm])
+
+    @pytest.mark.asyncio
+    async def test_quota_recovers_after_period(self, limiter, clock):
+        """Test the full quota is available again one period later."""
+        assert await burst(limiter, 10) == 10
+        clock.advance(20)
+
+        assert await burst(limiter, 20) == 10
+
+    @pytest.mark.asyncio
+    async def test_retry_after_is_accurate(self, limiter, clock):
+        """Test a request retried after `Retry-After` is admitted, and one retried just before is not."""
+        clock.advance(3)
+        await burst(limiter, 10)
+        result = await limiter.check(user_id=1, path="/api/v1/tasks", limit=10, period=10)
+        assert result.limited and result.retry_after > 0
+
+        clock.advance(result.retry_after - 0.01)
+        assert (await limiter.check(user_id=1, path="/api/v1/tasks", limit=10, period=10)).limited
+
+        clock.advance(0.02)
+        assert not (await limiter.check(user_id=1, path="/api/v1/tasks", limit=10, period=10)).limited
+
+    @pytest.mark.asyncio
+    async def test_remaining_counts_down(self, limiter, clock):
+        """Test the remaining quota decreases by one per admitted request."""
+        remaining = [
+            (await limiter.check(user_id=1, path="/api/v1/tasks", limit=5, period=10)).remaining for _ in range(6)
+        ]
+
+        assert remaining == [4, 3, 2, 1, 0, 0]
+
+    @pytest.mark.asyncio
+    async def test_leases_do_not_exceed_the_limit(self, limiter, clock):
+        """Test leasing quota in chunks admits no more than the limit within a period."""
+        limiter.lease_fraction = 0.3
+
+        assert await burst(limiter, 100) == 10
+
+
+class TestThroughput:
+    """Benchmark the limiter and fail on throughput regressions.
+
+    Thresholds are conservative for fakeredis and can be tightened with `RATE_LIMIT_BENCHMARK_MIN_CPS` and
+    `RATE_LIMIT_BENCHMARK_MAX_P99`, e.g. when pointing the suite at a real Redis in CI.
+    """
+
+    @pytest.mark.asyncio
+    async def test_checks_per_second(self, limiter):
+        """Test 64 concurrent clients sustain the minimum check rate."""
+
+        async def client(user_id: int) -> None:
+            for _ in range(25):
+                await limiter.check(user_id=user_id, path="/api/v1/tasks", limit=1000, period=60)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(client(user_id) for user_id in range(64)))
+        checks_per_second = 64 * 25 / (time.perf_counter() - started_at)
+
+        assert checks_per_second >= MIN_CHECKS_PER_SECOND, f"{limiter.algorithm}: {checks_per_second:.0f} checks/s"
+
+    @pytest.mark.asyncio
+    async def test_p99_latency(self, limiter):
+        """Test the 99th percentile latency of a single check."""
+        latencies = []
+        for user_id in range(500):
+            started_at = time.perf_counter()
+            await limiter.check(user_id=user_id % 50, path="/api/v1/tasks", limit=1000, period=60)
+            latencies.append(time.perf_counter() - started_at)
+
+        p99 = statistics.quantiles(latencies, n=100)[98]
+
+        assert p99 <= MAX_P99_SECONDS, f"{limiter.algorithm}: p99 {p99 * 1000:.2f} ms"
@@ -0,0 +1,482 @@
+"""Unit tests for token verification and the token cache."""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import bcrypt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from fastapi import Request
+from jose import JWTError, jwt
+from jose.utils import base64url_decode
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.app.api.dependencies import get_current_superuser, get_current_user, get_optional_user
+from src.app.api.v1.jwks import read_jwks
+from src.app.api.v1.users import patch_user
+from src.app.core.exceptions.http_exceptions import NotFoundException, UnauthorizedException
+from src.app.core.security import (
+    KeyRing,
+    TokenCache,
+    TokenType,
+    authenticate_user,
+    blacklist_token,
+    create_access_token,
+    decode_token,
+    get_password_hashing_stats,
+    hash_password,
+    token_cache,
+    verify_password,
+    verify_token,
+)
+from src.app.core.utils.token_blacklist import BloomFilter, TokenBlacklist
+from src.app.schemas.user import UserUpdate
+
+
+def make_request(token: str | None = None) -> Request:
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+
+class TestTokenCache:
+    """Test the in-process token cache."""
+
+    def test_entries_expire_with_ttl_or_token(self, current_user_dict):
+        """Test entries are kept for the shorter of the TTL and the token's remaining lifetime."""
+        cache = TokenCache(ttl=30)
+        cache.set("short", current_user_dict, exp=time.time() + 5)
+        cache.set("long", current_user_dict, exp=time.time() + 3600)
+
+        assert cache.entries[cache._key("short")][1] <= time.time() + 5
+        assert cache.entries[cache._key("long")][1] <= time.time() + 30
+
+        cache.set("expired", current_user_dict, exp=time.time() - 1)
+        assert cache.get("expired") is None
+
+    def test_invalidate_user_drops_all_their_tokens(self, current_user_dict):
+        """Test every token of a user is dropped when the user changes."""
+        cache = TokenCache(ttl=30)
+        cache.set("a", current_user_dict, exp=time.time() + 60)
+        cache.set("b", current_user_dict, exp=time.time() + 60)
+        cache.set("c", {**current_user_dict, "username": "other"}, exp=time.time() + 60)
+
+        cache.invalidate_user(current_user_dict["username"])
+
+        assert cache.get("a") is None and cache.get("b") is None
+        assert cache.get("c")["username"] == "other"
+
+    def test_size_is_bounded(self, current_user_dict):
+        """Test the least recently used token is dropped beyond the maximum."""
+        cache = TokenCache(ttl=30, max_entries=2)
+        for token in ("a", "b"):
+            cache.set(token, current_user_dict, exp=time.time() + 60)
+        cache.get("a")
+        cache.set("c", current_user_dict, exp=time.time() + 60)
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+
+    def test_disabled_with_zero_ttl(self, current_user_dict):
+        """Test nothing is cached with a TTL of 0."""
+        cache = TokenCache(ttl=0)
+        cache.set("a", current_user_dict, exp=time.time() + 60)
+
+        assert cache.get("a") is None
+
+
+class TestGetCurrentUser:
+    """Test authenticated requests are resolved from the cache."""
+
+    @pytest.mark.asyncio
+    async def test_second_request_skips_database(self, mock_db, current_user_dict):
+        """Test the blacklist and user lookups run once per token."""
+        token = await create_access_token(data={"sub": current_user_dict["username"]})
+
+        with (
+            patch("src.app.core.utils.token_blacklist.crud_token_blacklist") as mock_blacklist,
+            patch("src.app.api.dependencies.crud_users") as mock_users,
+        ):
+            mock_blacklist.exists = AsyncMock(return_value=False)
+            mock_users.get = AsyncMock(return_value=current_user_dict)
+
+            assert await get_current_user(make_request(), token, mock_db) == current_user_dict
+            assert await get_current_user(make_request(), token, mock_db) == current_user_dict
+
+            mock_blacklist.exists.assert_awaited_once()
+            mock_users.get.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_blacklisted_token_is_evicted(self, mock_db, current_user_dict):
+        """Test a token is no longer served from the cache once it is blacklisted."""
+        token = await create_access_token(data={"sub": current_user_dict["username"]})
+        token_cache.set(token, current_user_dict, exp=time.time() + 60)
+
+        with (
+            patch("src.app.core.security.crud_token_blacklist") as mock_create,
+            patch("src.app.core.utils.token_blacklist.crud_token_blacklist") as mock_blacklist,
+        ):
+            mock_create.create = AsyncMock()
+            mock_blacklist.exists = AsyncMock(return_value=True)
+            await blacklist_token(token, mock_db)
+
+            with pytest.raises(UnauthorizedException):
+                await get_current_user(make_request(), token, mock_db)
+
+    @pytest.mark.asyncio
+    async def test_token_is_verified_once_per_request(self, mock_db, current_user_dict):
+        """Test the optional, current and superuser dependencies of one request share a single verification."""
+        token = await create_access_token(data={"sub": current_user_dict["username"]})
+        request = make_request(token)
+
+        with (
+            patch.object(token_cache, "ttl", 0),
+            patch("src.app.api.dependencies.verify_token", new_callable=AsyncMock) as mock_verify,
+            patch("src.app.api.dependencies.crud_users") as mock_users,
+        ):
+            mock_verify.return_value.username_or_email = current_user_dict["username"]
+            mock_users.get = AsyncMock(return_value={**current_user_dict, "is_superuser": True})
+
+            user = await get_optional_user(request, mock_db)
+            assert await get_current_user(request, token, mock_db) == user
+            assert await get_current_superuser(user) == user
+            await get_current_user(make_request(token), token, mock_db)
+
+            assert mock_verify.await_count == 2
+            assert mock_users.get.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_invalid_token_is_shared_too(self, mock_db):
+        """Test an invalid token is rejected by every dependency without being verified again."""
+        request = make_request("invalid")
+
+        with patch("src.app.api.dependencies.verify_token", new_callable=AsyncMock, return_value=None) as mock_verify:
+            assert await get_optional_user(request, mock_db) is None
+            with pytest.raises(UnauthorizedException):
+                await get_current_user(request, "invalid", mock_db)
+
+            mock_verify.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_user_update_invalidates(self, mock_db, current_user_dict, sample_user_read):
+        """Test updating a user drops the cached tokens of that user."""
+        token_cache.set("token", current_user_dict, exp=time.time() + 60)
+
+        with patch("src.app.api.v1.users.crud_users") as mock_crud:
+            mock_crud.get = AsyncMock(
+                return_value=sample_user_read.model_copy(update={"username": current_user_dict["username"]})
+            )
+            mock_crud.exists = AsyncMock(return_value=False)
+            mock_crud.update = AsyncMock()
+
+            await patch_user(
+                AsyncMock(),
+                UserUpdate(name="New Name", username=current_user_dict["username"]),
+                current_user_dict["username"],
+                current_user_dict,
+                mock_db,
+            )
+
+        assert token_cache.get("token") is None
+
+
+@pytest.fixture
+def blacklist():
+    fakeredis = pytest.importorskip("fakeredis")
+    blacklist = TokenBlacklist(capacity=1000)
+    blacklist.client = fakeredis.FakeAsyncRedis()
+    blacklist.ready = True
+    with patch("src.app.core.security.token_blacklist", blacklist):
+        yield blacklist
+
+
+class TestBloomFilter:
+    """Test the Bloom filter of revoked tokens."""
+
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        """Test added items are always found and others rarely are, at capacity."""
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"revoked-{i}")
+
+        assert all(f"revoked-{i}" in bloom for i in range(1000))
+        assert sum(f"other-{i}" in bloom for i in range(10_000)) < 300
+
+
+class TestTokenBlacklist:
+    """Test the Redis token blacklist and its Bloom filter pre-check."""
+
+    @pytest.mark.asyncio
+    async def test_unrevoked_token_costs_no_io(self, blacklist, mock_db):
+        """Test a token absent from the Bloom filter is accepted without Redis or database lookups."""
+        blacklist.client = MagicMock()
+        with patch("src.app.core.utils.token_blacklist.crud_token_blacklist") as mock_crud:
+            assert not await blacklist.is_revoked("jti", "token", mock_db)
+
+        blacklist.client.exists.assert_not_called()
+        mock_crud.exists.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_revoked_token_expires_with_token(self, blacklist, mock_db):
+        """Test revoked tokens are kept in Redis for their remaining lifetime."""
+        await blacklist.revoke("token", "jti", exp=time.time() + 60)
+
+        assert await blacklist.is_revoked("jti", "token", mock_db)
+        assert 0 < await blacklist.client.ttl("token_blacklist:jti") <= 60
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_database_without_redis(self, blacklist, mock_db):
+        """Test the durable log in the database is checked when Redis is unavailable."""
+        blacklist.bloom.add("jti")
+        blacklist.client = None
+        with patch("src.app.core.utils.token_blacklist.crud_token_blacklist") as mock_crud:
+            mock_crud.exists = AsyncMock(return_value=True)
+
+            assert await blacklist.is_revoked("jti", "token", mock_db)
+
+    @pytest.mark.asyncio
+    async def test_filter_is_not_trusted_until_loaded(self, blacklist, mock_db):
+        """Test Redis is checked for every token while the filter is not in sync."""
+        blacklist.ready = False
+        await blacklist.client.set("token_blacklist:jti", 1)
+
+        assert await blacklist.is_revoked("jti", "token", mock_db)
+
+    @pytest.mark.asyncio
+    async def test_load_rebuilds_from_database(self, blacklist, mock_db):
+        """Test the filter and the Redis keys are rebuilt from the unexpired rows of the database."""
+        token = await create_access_token(data={"sub": "user"})
+        payload = jwt.get_unverified_claims(token)
+        rows = [{"token": token, "expires_at": datetime.fromtimestamp(payload["exp"])}]
+        with patch("src.app.core.utils.token_blacklist.crud_token_blacklist") as mock_crud:
+            mock_crud.get_multi = AsyncMock(return_value={"data": rows})
+            await blacklist.load(mock_db)
+
+        assert payload["jti"] in blacklist.bloom
+        assert await blacklist.client.exists(f"token_blacklist:{payload['jti']}")
+
+    @pytest.mark.asyncio
+    async def test_failed_revocation_is_retried(self, blacklist):
+        """Test a revocation Redis could not take is kept pending, then stored and broadcast by the next flush."""
+        pipe = MagicMock()
+        pipe.__aenter__ = AsyncMock(return_value=pipe)
+        pipe.__aexit__ = AsyncMock(return_value=None)
+        pipe.execute = AsyncMock(side_effect=RedisConnectionError("down"))
+        with patch.object(blacklist.client, "pipeline", return_value=pipe):
+            await blacklist.revoke("token", "jti", exp=time.time() + 60)
+
+        assert "jti" in blacklist.pending
+        pubsub = blacklist.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(blacklist.channel)
+
+        await blacklist.flush()
+
+        assert not blacklist.pending
+        assert await blacklist.client.exists("token_blacklist:jti")
+        messages = [await pubsub.get_message(timeout=0.1) for _ in range(2)]
+        assert [json.loads(message["data"])["jti"] for message in messages if message is not None] == ["jti"]
+
+    def test_revocations_of_other_workers_are_applied(self, blacklist):
+        """Test broadcast revocations are added to the filter and evicted from the token cache."""
+        blacklist.on_revoke = MagicMock()
+        blacklist._apply({"data": '{"jti": "jti", "token_hash": "hash"}'})
+
+        assert "jti" in blacklist.bloom
+        blacklist.on_revoke.assert_called_once_with("hash")
+
+    @pytest.mark.asyncio
+    async def test_listener_retries_after_database_error(self, blacklist):
+        """Test a failed load from the database is retried instead of stopping the listener for good."""
+        session_factory = MagicMock()
+        session_factory.return_value.__aenter__ = AsyncMock(return_value=MagicMock())
+        session_factory.return_value.__aexit__ = AsyncMock(return_value=None)
+        load = AsyncMock(side_effect=[OSError("connection refused"), asyncio.CancelledError])
+
+        with (
+            patch("src.app.core.utils.token_blacklist.local_session", session_factory),
+            patch.object(blacklist, "load", load),
+            patch("src.app.core.utils.token_blacklist.asyncio.sleep", AsyncMock()) as sleep,
+        ):
+            with pytest.raises(asyncio.CancelledError):
+                await blacklist.listen()
+
+        assert load.await_count == 2
+        sleep.assert_awaited_once_with(1.0)
+        assert not blacklist.ready
+
+    @pytest.mark.asyncio
+    async def test_verify_token_rejects_revoked_token(self, blacklist, mock_db):
+        """Test a logged out token is rejected and other tokens of the user are not."""
+        token = await create_access_token(data={"sub": "user"})
+        other = await create_access_token(data={"sub": "user"})
+        with patch("src.app.core.security.crud_token_blacklist") as mock_crud:
+            mock_crud.create = AsyncMock()
+            await blacklist_token(token, mock_db)
+
+        assert await verify_token(token, TokenType.ACCESS, mock_db) is None
+        assert await verify_token(other, TokenType.ACCESS, mock_db) is not None
+
+
+class TestPasswordHashing:
+    """Test password hashing runs on the bounded pool and is upgraded on login."""
+
+    @pytest.mark.asyncio
+    async def test_hashing_does_not_block_the_event_loop(self):
+        """Test other coroutines keep running while passwords are hashed."""
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        with patch("src.app.core.security.settings.PASSWORD_HASH_ROUNDS", 10):
+            hashed = await hash_password("password")
+            assert await verify_password("password", hashed)
+        task.cancel()
+
+        assert ticks > 5
+        assert get_password_hashing_stats() == {"max_workers": 4, "in_flight": 0, "queued": 0}
+
+    @pytest.mark.asyncio
+    async def test_login_rehashes_on_cost_change(self, mock_db, current_user_dict):
+        """Test a password hashed with another cost is rehashed with the configured cost on login."""
+        user = {**current_user_dict, "hashed_password": bcrypt.hashpw(b"password", bcrypt.gensalt(rounds=4)).decode()}
+
+        with (
+            patch("src.app.core.security.crud_users") as mock_crud,
+            patch("src.app.core.security.settings.PASSWORD_HASH_ROUNDS", 5),
+        ):
+            mock_crud.get = AsyncMock(return_value=user)
+            mock_crud.update = AsyncMock()
+
+            assert await authenticate_user(user["username"], "password", mock_db)
+            hashed = mock_crud.update.call_args.kwargs["object"]["hashed_password"]
+            assert hashed.startswith("$2b$05$")
+
+            mock_crud.get = AsyncMock(return_value={**user, "hashed_password": hashed})
+            mock_crud.update.reset_mock()
+            assert await authenticate_user(user["username"], "password", mock_db)
+            mock_crud.update.assert_not_called()
+
+
+def write_key(directory, kid: str, curve: ec.EllipticCurve | None = None) -> None:
+    private_key = ec.generate_private_key(curve) if curve else rsa.generate_private_key(65537, 2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    (directory / f"{kid}.pem").write_bytes(pem)
+
+
+@pytest.fixture
+def key_ring(tmp_path):
+    write_key(tmp_path, "2026-01")
+    key_ring = KeyRing(str(tmp_path), "RS256", max_age=0)
+    with (
+        patch("src.app.core.security.key_ring", key_ring),
+        patch("src.app.api.v1.jwks.key_ring", key_ring),
+    ):
+        yield key_ring
+
+
+class TestKeyRing:
+    """Test asymmetric signing, key rotation and the JWKS endpoint."""
+
+    @pytest.mark.asyncio
+    async def test_tokens_verify_against_published_keys(self, key_ring):
+        """Test tokens carry a key id and verify with the JWKS alone, as another service would."""
+        token = await create_access_token(data={"sub": "user"})
+        jwks = await read_jwks(MagicMock())
+
+        assert jwt.get_unverified_header(token)["kid"] == "2026-01"
+        assert jwt.decode(token, jwks["keys"][0], algorithms=["RS256"])["sub"] == "user"
+        assert "d" not in jwks["keys"][0]
+
+    @pytest.mark.asyncio
+    async def test_rotation(self, key_ring, tmp_path):
+        """Test a new key signs new tokens while the previous one keeps verifying until removed."""
+        old_token = await create_access_token(data={"sub": "user"})
+        write_key(tmp_path, "2026-02")
+        new_token = await create_access_token(data={"sub": "user"})
+
+        assert jwt.get_unverified_header(new_token)["kid"] == "2026-02"
+        assert decode_token(old_token)["sub"] == decode_token(new_token)["sub"] == "user"
+
+        (tmp_path / "2026-01.pem").unlink()
+        with pytest.raises(JWTError):
+            decode_token(old_token)
+
+    @pytest.mark.asyncio
+    async def test_unknown_key_is_rejected(self, key_ring, tmp_path):
+        """Test tokens signed by a key outside the key ring are rejected."""
+        other = tmp_path / "other"
+        other.mkdir()
+        write_key(other, "2026-01")
+        with patch("src.app.core.security.key_ring", KeyRing(str(other), "RS256")):
+            token = await create_access_token(data={"sub": "user"})
+
+        with pytest.raises(JWTError):
+            decode_token(token)
+
+    @pytest.mark.asyncio
+    async def test_key_rotated_by_another_worker_is_found(self, key_ring, tmp_path):
+        """Test a token signed with a key added after the last scan verifies without waiting for max_age."""
+        ring = KeyRing(str(tmp_path), "RS256", max_age=3600)
+        ring.signing_key()
+        ring.loaded_at -= ring.rescan_interval
+        write_key(tmp_path, "2026-02")
+        token = await create_access_token(data={"sub": "user"})
+
+        with patch("src.app.core.security.key_ring", ring):
+            assert decode_token(token)["sub"] == "user"
+
+    def test_unknown_key_ids_rescan_at_most_once_per_interval(self, tmp_path):
+        """Test junk key ids do not make every verification scan the key directory."""
+        write_key(tmp_path, "2026-01")
+        ring = KeyRing(str(tmp_path), "RS256", max_age=3600, rescan_interval=60)
+        ring.signing_key()
+        ring.loaded_at -= 60
+
+        path_type = type(ring.directory)
+        with patch.object(path_type, "glob", autospec=True, side_effect=path_type.glob) as mock_glob:
+            for kid in ("junk-1", "junk-2", "junk-3"):
+                with pytest.raises(JWTError):
+                    ring.verification_key(kid)
+
+        assert mock_glob.call_count == 1
+
+    def test_parsed_keys_are_cached(self, key_ring):
+        """Test unchanged key files are not parsed again."""
+        key_ring.signing_key()
+        with patch("src.app.core.security.jwk.construct") as mock_construct:
+            key_ring.signing_key()
+            key_ring.verification_key("2026-01")
+
+        mock_construct.assert_not_called()
+
+    def test_ec_coordinates_have_fixed_length(self, tmp_path):
+        """Test EC public keys are published with 32 byte coordinates for P-256."""
+        for i in range(8):
+            write_key(tmp_path, f"ec-{i}", ec.SECP256R1())
+
+        jwks = KeyRing(str(tmp_path), "ES256").jwks()
+
+        assert {len(base64url_decode(key[c].encode())) for key in jwks["keys"] for c in ("x", "y")} == {32}
+
+    @pytest.mark.asyncio
+    async def test_no_jwks_with_shared_secret(self):
+        """Test the JWKS endpoint is not found in HS256 mode."""
+        with pytest.raises(NotFoundException):
+            await read_jwks(MagicMock())
@@ -4,8 +4,9 @@ from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
-from src.app.api.v1.users import erase_user, patch_user, read_user, read_users, write_user
+from src.app.api.v1.users import erase_user, patch_user, read_user, read_user_tier, read_users, write_user
 from src.app.core.exceptions.http_exceptions import DuplicateValueException, ForbiddenException, NotFoundException
+from src.app.crud.crud_users import UserLookupCache, user_lookup_cache
 from src.app.schemas.user import UserCreate, UserRead, UserUpdate
 
 
@@ -23,7 +24,7 @@ class TestWriteUser:
             mock_crud.create = AsyncMock(return_value=Mock(id=1))
             mock_crud.get = AsyncMock(return_value=sample_user_read)
 
-            with patch("src.app.api.v1.users.get_password_hash") as mock_hash:
+            with patch("src.app.api.v1.users.hash_password", new_callable=AsyncMock) as mock_hash:
                 mock_hash.return_value = "hashed_password"
 
                 result = await write_user(Mock(), user_create, mock_db)
@@ -189,3 +190,85 @@ class TestEraseUser:
 
             with pytest.raises(ForbiddenException):
                 await erase_user(Mock(), username, current_user_dict, mock_db, token)
+
+
+class TestUserLookupCache:
+    """Test username lookups are served from the user cache."""
+
+    @pytest.fixture
+    def summary(self, current_user_dict):
+        return {
+            **current_user_dict,
+            "profile_image_url": "https://profileimageurl.com",
+            "tier_id": None,
+            "is_deleted": False,
+        }
+
+    @pytest.mark.asyncio
+    async def test_second_lookup_skips_database(self, mock_db, summary):
+        """Test a username is resolved from the database once within the TTL."""
+        cache = UserLookupCache(ttl=30)
+        with patch("src.app.crud.crud_users.crud_users") as mock_crud:
+            mock_crud.get = AsyncMock(return_value=summary)
+
+            assert (await cache.get(mock_db, summary["username"]))["id"] == summary["id"]
+            assert (await cache.get(mock_db, summary["username"]))["id"] == summary["id"]
+
+            mock_crud.get.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_soft_deleted_users(self, mock_db, summary):
+        """Test soft-deleted users are only returned when asked for, from the same entry."""
+        cache = UserLookupCache(ttl=30)
+        with patch("src.app.crud.crud_users.crud_users") as mock_crud:
+            mock_crud.get = AsyncMock(return_value={**summary, "is_deleted": True})
+
+            assert await cache.get(mock_db, summary["username"]) is None
+            assert "is_deleted" not in await cache.get(mock_db, summary["username"], include_deleted=True)
+            mock_crud.get.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_unknown_usernames_are_not_cached(self, mock_db, summary):
+        """Test a user created after a failed lookup is found."""
+        cache = UserLookupCache(ttl=30)
+        with patch("src.app.crud.crud_users.crud_users") as mock_crud:
+            mock_crud.get = AsyncMock(side_effect=[None, summary])
+
+            assert await cache.get(mock_db, summary["username"]) is None
+            assert await cache.get(mock_db, summary["username"]) is not None
+
+    @pytest.mark.asyncio
+    async def test_user_update_invalidates(self, mock_db, current_user_dict, sample_user_read, summary):
+        """Test updating a user drops the cached entry."""
+        user_lookup_cache.set(current_user_dict["username"], summary)
+        sample_user_read.username = current_user_dict["username"]
+
+        with patch("src.app.api.v1.users.crud_users") as mock_crud:
+            mock_crud.get = AsyncMock(return_value=sample_user_read)
+            mock_crud.exists = AsyncMock(return_value=False)
+            mock_crud.update = AsyncMock()
+
+            await patch_user(
+                Mock(),
+                UserUpdate(name="New Name", username=current_user_dict["username"]),
+                current_user_dict["username"],
+                current_user_dict,
+                mock_db,
+            )
+
+        assert current_user_dict["username"] not in user_lookup_cache.entries
+
+    @pytest.mark.asyncio
+    async def test_read_user_tier(self, mock_db, summary):
+        """Test the tier endpoint resolves the user from the cache."""
+        user_lookup_cache.set(summary["username"], {**summary, "tier_id": 1})
+        try:
+            with patch("src.app.api.v1.users.crud_tiers") as mock_tiers:
+                mock_tiers.get = AsyncMock(return_value={"id": 1, "name": "free"})
+
+                result = await read_user_tier(Mock(), summary["username"], mock_db)
+        finally:
+            user_lookup_cache.clear()
+
+        assert result["tier_name"] == "free"
+        assert result["username"] == summary["username"]
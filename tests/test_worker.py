@@ -0,0 +1,53 @@
+"""Unit tests for the arq worker jobs."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.app.core.worker.functions import purge_expired_tokens
+
+
+def select_result(ids: list[int]) -> MagicMock:
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = ids
+    return result
+
+
+class TestPurgeExpiredTokens:
+    """Test the expired token purge job."""
+
+    @pytest.mark.asyncio
+    async def test_purges_in_batches(self):
+        """Test expired rows are deleted one batch per transaction until a partial batch is found."""
+        db = AsyncMock()
+        db.execute = AsyncMock(side_effect=[select_result([1, 2]), None, select_result([3]), None])
+        session = MagicMock()
+        session.return_value.__aenter__.return_value = db
+
+        with patch("src.app.core.worker.functions.local_session", session):
+            report = await purge_expired_tokens({}, batch_size=2)
+
+        assert report["purged"] == 3
+        assert report["seconds"] >= 0
+        assert db.commit.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_nothing_to_purge(self):
+        """Test no delete is issued when no row has expired."""
+        db = AsyncMock()
+        db.execute = AsyncMock(return_value=select_result([]))
+        session = MagicMock()
+        session.return_value.__aenter__.return_value = db
+
+        with patch("src.app.core.worker.functions.local_session", session):
+            report = await purge_expired_tokens({}, batch_size=2)
+
+        assert report["purged"] == 0
+        db.execute.assert_awaited_once()
+        db.commit.assert_not_awaited()
+
+    def test_scheduled_as_cron_job(self):
+        """Test the worker runs the purge on its cron schedule."""
+        from src.app.core.worker.settings import WorkerSettings
+
+        assert [job.coroutine for job in WorkerSettings.cron_jobs] == [purge_expired_tokens]